@@ -1,18 +1,53 @@
 import datetime
+import json
 from functools import wraps
 
-from flask import abort, jsonify, request, make_response
+from flask import abort, jsonify, request, make_response, Response
 from flask.blueprints import Blueprint
-from werkzeug.security import check_password_hash
 import jwt
+from sqlalchemy.exc import IntegrityError
 
+from data.ads_feed import ads_feed
+from data.chat_history import get_chat_page, parse_page_args
+from data.conversations import get_conversation, get_conversations, mark_conversation_read
 from data.db_session import create_session
+from data.identity_cache import user_cache
+from data.leaderboard import get_leaderboard_position, top_cache
+from data.message_search import parse_search_args, search_messages
+from data.messaging import send_messages
+from data.notifications import hub
+from data.passwords import PasswordHasherBusy
+from data.people_search import search_users
+from data.rating_rollups import get_window_top
+from data.repositories import get_user_details, get_latest_ads, email_taken, phone_taken
+from data.serializers import json_response, serializer
+from data.tokens import ACCESS, REFRESH, issue_tokens, password_marker, token_cache
+from data.typeahead import typeahead
+from data.user_listing import get_users_page, parse_listing_args, stream_users
+from data.write_behind import WriteBehindUnavailable, submit_message
 from data.__all_models import *
-from data.constants import SECRET_KEY
+from data.constants import LONG_POLL_TIMEOUT, MESSAGES_BATCH_LIMIT, WRITE_BEHIND_DURABILITY, \
+    RATING_WINDOWS
 
 # создаем blueprint для API
 api_blueprint = Blueprint('api', __name__, template_folder='templates', static_folder='static')
 
+# скомпилированные сериализаторы моделей (результат совпадает с to_dict())
+user_json = serializer(User)  # все данные пользователя
+public_user_json = serializer(User, rules=('-email',))  # данные пользователя без персональных
+message_json = serializer(Message)
+ad_json = serializer(Advertisement)
+interest_json = serializer(Interest)
+
+
+def get_request_token():
+    """Функция, получающая токен из запроса: из заголовка "Authorization: Bearer <токен>"
+    или из параметра "x-access-token"."""
+    header = request.headers.get('Authorization', '')
+    if header[:7].lower() == 'bearer ':
+        return header[7:].strip()
+    return request.args.get('x-access-token')
+
 
 def token_required(func):
     """Декоратор для функций, проверяющий наличие токена в запросе.
@@ -20,21 +55,21 @@ def token_required(func):
 
     @wraps(func)
     def decorated(*args, **kwargs):
-        token = request.args.get('x-access-token')  # получаем токен из запроса
+        token = get_request_token()  # получаем токен из запроса
         if not token:  # проверяем наличие токена
             abort(400)  # если токена нет - возвращаем ошибку
         try:
-            session = create_session()
-            data = jwt.decode(token, SECRET_KEY)
-            user = session.query(User).filter(
-                User.id == data['id']).first()  # получаем владельца токена по его id, закодированном в токене
-        except jwt.exceptions.DecodeError and KeyError:
-            # если при декодинге или при получении данных из токена возникли ошибки - возвращаем сообщение о том,
-            # что токен недействителен
-            return jsonify({'message': 'Token is invalid!'})
+            data = token_cache.decode(token)  # подпись уже проверенных токенов повторно не проверяется
+            if data.get('type', ACCESS) != ACCESS:  # токеном обновления нельзя пользоваться для доступа к API
+                raise KeyError('type')
+            user = user_cache.get(data['id'])  # получаем владельца токена по его id, закодированном в токене
         except jwt.exceptions.ExpiredSignatureError:
             # если при декодинге выяснилось, что токен просрочен - возвращаем сообщения о том, что токен просрочен
             return jsonify({'message': 'Token is expired!'})
+        except (jwt.exceptions.InvalidTokenError, KeyError, TypeError, ValueError):
+            # если при декодинге или при получении данных из токена возникли ошибки - возвращаем сообщение о том,
+            # что токен недействителен
+            return jsonify({'message': 'Token is invalid!'})
 
         return func(user, *args, **kwargs)
 
@@ -54,23 +89,85 @@ def login():
     user = session.query(User).filter(User.email == auth_data.username).first()
     if not user:  # проверяем, найден ли такой пользователь
         abort(404)  # если пользователь не найден - возвращаем ошибку
-    if not check_password_hash(user.hashed_password, auth_data.password):  # проверяем пароль
-        return jsonify({'message': 'Incorrect password'})  # если пароль неверный - возвращаем ошибку
-    # кодируем токен через ключ безопасности приложения и возвращаем его в кодировке UTF-8
-    token = jwt.encode({'id': user.id, 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)}, SECRET_KEY)
-    return jsonify({'token': token.decode('UTF-8')})
+    try:  # проверяем пароль (в пуле процессов хэширования)
+        if not user.check_password(auth_data.password):
+            return jsonify({'message': 'Incorrect password'})  # если пароль неверный - возвращаем ошибку
+        if user.rehash_password(auth_data.password):  # пересчитываем хэш, созданный с устаревшими параметрами
+            session.commit()
+            user_cache.invalidate(user.id)
+    except PasswordHasherBusy:
+        abort(503)  # если пул хэширования перегружен - просим повторить запрос позже
+    # выдаем токен доступа и токен обновления, подписанные ключом безопасности приложения
+    return jsonify(issue_tokens(user))
+
+
+@api_blueprint.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    """Обработчик запроса на обновление токена по токену обновления (без проверки пароля)."""
+    # получаем токен обновления из json запроса или из заголовка авторизации
+    token = request.json.get('refresh_token') if isinstance(request.json, dict) else None
+    token = token or get_request_token()
+    if not token or not isinstance(token, str):  # проверяем наличие токена обновления
+        abort(400)  # если токена нет - возвращаем ошибку
+    try:
+        data = token_cache.decode(token)
+        if data.get('type') != REFRESH:  # проверяем, что это именно токен обновления
+            raise KeyError('type')
+        session = create_session()
+        user = session.query(User).get(data['id'])  # получаем владельца токена
+        # токены обновления, выданные до смены пароля, недействительны
+        if not user or data.get('pwd') != password_marker(user.hashed_password):
+            raise KeyError('pwd')
+    except jwt.exceptions.ExpiredSignatureError:
+        return jsonify({'message': 'Token is expired!'})  # если токен просрочен - возвращаем сообщение об этом
+    except (jwt.exceptions.InvalidTokenError, KeyError, TypeError, ValueError):
+        return jsonify({'message': 'Token is invalid!'})  # если токен недействителен - возвращаем сообщение об этом
+    return jsonify(issue_tokens(user))
 
 
 @api_blueprint.route('/users', methods=['GET'])
 @token_required
 def get_users(current_user: User):
-    """Обработчик запроса на получение данных о всех пользователях.
+    """Обработчик запроса на получение данных о пользователях (постранично или потоком NDJSON).
     :param current_user: клиент"""
     if not current_user.admin:  # проверяем, является ли клиент администратором
         abort(403)  # если клиент таковым не является - воозвращаем сообщение об ошибке
+    try:  # получаем курсор, размер страницы и выбранные поля
+        after_id, limit, fields = parse_listing_args(request.args)
+    except ValueError:
+        abort(400)  # если параметры запроса некорректны - возвращаем ошибку
+    session = create_session()
+    if request.args.get('format') == 'ndjson':  # проверяем, запрошен ли потоковый режим
+        # если да - отдаем пользователей по одному json-объекту на строку по мере чтения из базы
+        def rows():
+            try:
+                for user in stream_users(session, after_id, fields):
+                    yield json.dumps(user, ensure_ascii=False) + '\n'
+            finally:  # закрываем курсор и сессию и при обрыве соединения клиентом
+                session.close()
+
+        return Response(rows(), mimetype='application/x-ndjson')
+    users, has_more = get_users_page(session, after_id, limit, fields)  # получаем страницу пользователей
+    return json_response({'users': users, 'has_more': has_more})
+
+
+@api_blueprint.route('/users/search', methods=['GET'])
+@token_required
+def search_people(current_user: User):
+    """Обработчик запроса на поиск пользователей по имени, фамилии или номеру телефона.
+    :param current_user: клиент"""
+    try:  # получаем поисковый запрос и номер страницы результатов
+        query, page, limit = parse_search_args(request.args)
+    except ValueError:
+        abort(400)  # если параметры запроса некорректны - возвращаем ошибку
+    if not query:  # проверяем наличие поискового запроса
+        abort(400)  # если запрос пуст - возвращаем ошибку
     session = create_session()
-    users = session.query(User).all()  # получаем список всех пользователей
-    return jsonify({'users': [user.to_dict() for user in users]})
+    users, has_more = search_users(session, query, page, limit)
+    # персональные данные остальных пользователей видны только администратору
+    return json_response({'users': [user_json(user) if current_user.admin or current_user.id == user.id
+                                     else public_user_json(user) for user in users],
+                          'page': page, 'has_more': has_more})
 
 
 @api_blueprint.route('/users/<int:user_id>', methods=['GET'])
@@ -80,15 +177,41 @@ def get_exact_user(current_user: User, user_id):
     :param user_id: id пользователя, данные которого необхдимо получить
     :param current_user: клиент"""
     session = create_session()
-    user = session.query(User).filter(User.id == user_id).first()  # получаем данные о пользователе по id
+    user = get_user_details(session, user_id)  # получаем данные о пользователе по id
     if not user:  # проверяем сущесвует ли пользователь
         abort(404)  # если пользователя не существует - возвращаем ошибку
     if current_user.admin or current_user.id == user_id:  # проверяем, хочет ли клиент получить данные о себе
         # если это так - возвращаем все данные
-        return jsonify({f'user{user_id}': user.to_dict()})
+        return json_response({f'user{user_id}': user_json(user)})
     # в противном случае - убираем персональные данные из ответа
-    return jsonify({f'user{user_id}': user.to_dict() if current_user.admin or current_user.id == user_id
-                    else user.to_dict(rules=('-email',))})
+    return json_response({f'user{user_id}': public_user_json(user)})
+
+
+@api_blueprint.route('/users/<int:user_id>/position', methods=['GET'])
+@token_required
+def get_user_position(current_user: User, user_id):
+    """Обработчик запроса на получение места пользователя на доске почета.
+    :param user_id: id пользователя
+    :param current_user: клиент"""
+    session = create_session()
+    user = session.query(User).get(user_id)  # получаем пользователя по первичному ключу
+    if not user:  # проверяем сущесвует ли пользователь
+        abort(404)  # если пользователя не существует - возвращаем ошибку
+    return jsonify({'id': user.id, 'rating': user.rating, 'position': get_leaderboard_position(session, user)})
+
+
+@api_blueprint.route('/top', methods=['GET'])
+@token_required
+def get_top(current_user: User):
+    """Обработчик запроса на получение доски почета.
+    :param current_user: клиент"""
+    window = request.args.get('period')  # получаем промежуток времени, за который нужна доска почета
+    if window is not None and window not in RATING_WINDOWS:  # проверяем корректность промежутка
+        abort(400)  # если промежуток неизвестен - возвращаем ошибку
+    session = create_session()
+    # получаем список лучших пользователей из кэша доски почета или из сверток журнала рейтинга за промежуток
+    users = top_cache.get(session) if window is None else get_window_top(session, window)
+    return jsonify({'top': [dict(entry._asdict(), position=i) for i, entry in enumerate(users, 1)]})
 
 
 @api_blueprint.route('/users', methods=['POST'])
@@ -107,6 +230,12 @@ def create_user(current_user: User):
         abort(400)  # если какие-либо данные отсутствуют - возвращаем ошибку
     if len(user_data['password']) < 8:  # проверяем длину пароля
         return jsonify({'message': 'Password is too short!'})  # если длина пароля меннее 8 символов - возвращаем ошибку
+    session = create_session()
+    # проверяем уникальность контактов до дорогого хэширования пароля
+    if email_taken(session, user_data['email']):
+        return jsonify({'message': 'Email is already taken!'})
+    if phone_taken(session, user_data['phone_number']):
+        return jsonify({'message': 'Phone number is already taken!'})
     # создаем нового пользвателя и заполняем данные о нем
     user = User()
     user.name = user_data['name']
@@ -114,10 +243,20 @@ def create_user(current_user: User):
     user.birthday = datetime.datetime.fromisoformat(user_data['birthday'])
     user.email = user_data['email']
     user.phone_number = user_data['phone_number']
-    user.set_password(user_data['password'])
-    session = create_session()
+    try:
+        user.set_password(user_data['password'])
+    except PasswordHasherBusy:
+        abort(503)  # если пул хэширования перегружен - просим повторить запрос позже
     session.add(user)
-    session.commit()
+    try:
+        version = typeahead.touch(session)  # новый пользователь появляется в подсказках поиска
+        session.commit()
+    except IntegrityError:  # адрес или номер успели занять после проверки (их ключи уникальны в базе)
+        session.rollback()
+        if email_taken(session, user_data['email']):
+            return jsonify({'message': 'Email is already taken!'})
+        return jsonify({'message': 'Phone number is already taken!'})
+    typeahead.apply(user, version)
     return jsonify({'message': 'Success!'})
 
 
@@ -134,13 +273,22 @@ def edit_user(current_user: User):
         # если найдены лишние ключи - возвращаем ошибку
         abort(400)
     session = create_session()
-    # получаем объект пользователя клиента и заменяем старые данные новыми
-    user = session.query(User).filter(User.id == current_user.id).first()
+    if user_data.get('phone_number') and phone_taken(session, user_data['phone_number'], exclude_id=current_user.id):
+        return jsonify({'message': 'Phone number is already taken!'})  # номер принадлежит другому пользователю
+    # загружаем актуальный объект пользователя клиента (объект из кэша используется только для чтения)
+    user = session.query(User).get(current_user.id)
+    old_name, old_surname, old_phone = user.name, user.surname, user.phone_number
+    # заменяем старые данные новыми
     user.name = user_data['name'] if user_data.get('name') else user.name
     user.surname = user_data['surname'] if user_data.get('surname') else user.surname
     user.birthday = datetime.datetime.fromisoformat(user_data['birthday']) \
         if user_data.get('birthday') else user.birthday
     user.phone_number = user_data['phone_number'] if user_data.get('phone_number') else user.phone_number
+    try:
+        session.flush()  # уникальность нормализованного номера проверяется индексом при записи
+    except IntegrityError:  # номер успели занять после проверки
+        session.rollback()
+        return jsonify({'message': 'Phone number is already taken!'})
     if user_data.get('interests'):
         if not user_data['interests'].get('ids'):  # проверяем наличие ключа ids (id новых интересов)
             abort(400)  # если такого ключа - возвращаем ошибку
@@ -155,23 +303,116 @@ def edit_user(current_user: User):
             user.interests.extend(interests)
         else:
             user.interests.extend(interests)
+    if user.name != old_name or user.surname != old_surname:  # проверяем, изменилось ли имя
+        top_cache.invalidate(session)  # если да - обновляем доску почета
+    version = None
+    if user.name != old_name or user.surname != old_surname or \
+            user.phone_number != old_phone:  # проверяем, изменились ли данные для подсказок поиска
+        version = typeahead.touch(session)  # если да - обновляем подсказки поиска
     session.commit()
+    user_cache.invalidate(current_user.id)  # профиль изменился - убираем клиента из кэша
+    if version is not None:
+        typeahead.apply(user, version)
     return jsonify({'message': 'Success!'})
 
 
+@api_blueprint.route('/chats', methods=['GET'])
+@token_required
+def get_chats(current_user: User):
+    """Обработчик запроса на получение списка чатов клиента с количеством непрочитанных сообщений.
+    :param current_user: клиент"""
+    session = create_session()
+    # получаем все диалоги клиента, упорядоченные по времени последнего сообщения
+    conversations = get_conversations(session, current_user.id)
+    chats = [{'user_id': conv.companion(current_user.id).id,
+              'last_message': message_json.one(conv.last_message),
+              'unread': conv.unread_for(current_user.id),
+              'last_read_id': conv.last_read_for(current_user.id),
+              'companion_last_read_id': conv.last_read_for(conv.companion(current_user.id).id)}
+             for conv in conversations]
+    return json_response({'chats': chats, 'unread': sum(chat['unread'] for chat in chats)})
+
+
+@api_blueprint.route('/messages/<int:user_id>/read', methods=['POST'])
+@token_required
+def read_chat(current_user: User, user_id):
+    """Обработчик запроса на отметку сообщений чата с пользователем прочитанными.
+    :param user_id: id собеседника
+    :param current_user: клиент"""
+    up_to_id = request.json.get('up_to_id') if isinstance(request.json, dict) else None  # получаем id отметки
+    if up_to_id is not None and not isinstance(up_to_id, int):  # проверяем корректность id отметки
+        abort(400)  # если id указан неверно - возвращаем ошибку
+    session = create_session()
+    mark_conversation_read(session, current_user.id, user_id, up_to_id)  # отмечаем сообщения прочитанными
+    conversation = get_conversation(session, current_user.id, user_id)
+    if not conversation:  # проверяем, существует ли чат с пользователем
+        abort(404)  # если чата нет - возвращаем ошибку
+    return jsonify({'unread': conversation.unread_for(current_user.id),
+                    'last_read_id': conversation.last_read_for(current_user.id)})
+
+
+@api_blueprint.route('/messages/search', methods=['GET'])
+@token_required
+def search_chats(current_user: User):
+    """Обработчик запроса на поиск по сообщениям клиента.
+    :param current_user: клиент"""
+    try:  # получаем поисковый запрос и номер страницы результатов
+        query, page, limit = parse_search_args(request.args)
+    except ValueError:
+        abort(400)  # если параметры запроса некорректны - возвращаем ошибку
+    if not query:  # проверяем наличие поискового запроса
+        abort(400)  # если запрос пуст - возвращаем ошибку
+    session = create_session()
+    # ищем сообщения с указанным текстом среди диалогов клиента
+    messages, has_more = search_messages(session, current_user.id, query, page, limit)
+    return json_response({'messages': message_json.many(messages), 'page': page, 'has_more': has_more})
+
+
 @api_blueprint.route('/messages/<int:user_id>', methods=['GET'])
 @token_required
 def get_chat(current_user: User, user_id):
-    """Обработчик запроса на получение всех чата с пользователем.
+    """Обработчик запроса на получение страницы чата с пользователем.
+    :param user_id: id собеседеника
+    :param current_user: клиент"""
+    try:  # получаем параметры запрошенной страницы переписки
+        before_id, after_id, limit = parse_page_args(request.args)
+    except ValueError:
+        abort(400)  # если параметры страницы некорректны - возвращаем ошибку
+    session = create_session()
+    # получаем страницу сообщений в чате между клиентом и пользователем с указанным id
+    messages, has_more = get_chat_page(session, current_user.id, user_id, before_id, after_id, limit)
+    if not messages and before_id is None and after_id is None:  # проверяем, были ли сообщения найдены
+        abort(404)  # если сообщений в чате нет совсем - возвращаем ошибку
+    conversation = get_conversation(session, current_user.id, user_id)  # получаем отметку прочтения собеседника
+    return json_response({f'chat_with_{user_id}': message_json.many(messages), 'has_more': has_more,
+                          'read_up_to': conversation.last_read_for(user_id) if conversation else 0})
+
+
+@api_blueprint.route('/messages/<int:user_id>/poll', methods=['GET'])
+@token_required
+def poll_chat(current_user: User, user_id):
+    """Обработчик запроса на ожидание новых сообщений в чате с пользователем (long polling).
     :param user_id: id собеседеника
     :param current_user: клиент"""
+    try:  # получаем id последнего известного клиенту сообщения и время ожидания
+        _, after_id, limit = parse_page_args(request.args)
+        timeout = min(float(request.args.get('timeout') or LONG_POLL_TIMEOUT), LONG_POLL_TIMEOUT)
+    except ValueError:
+        abort(400)  # если параметры запроса некорректны - возвращаем ошибку
+    if after_id is None or timeout < 0:  # проверяем наличие id последнего известного сообщения
+        abort(400)  # если его нет - возвращаем ошибку
     session = create_session()
-    # получаем список всех сообщений в чате между клиентом и пользователем с указанным id
-    messages = session.query(Message).filter(((Message.to_id == current_user.id) & (Message.from_id == user_id)) |
-                                             ((Message.from_id == current_user.id) & (Message.to_id == user_id))).all()
-    if not messages:  # проверяем, были ли сообщения найдены
-        abort(404)  # если сообщения не были найдены - возвращаем ошибку
-    return jsonify({f'chat_with_{user_id}': [message.to_dict() for message in messages]})
+    messages, has_more = get_chat_page(session, current_user.id, user_id, after_id=after_id, limit=limit)
+    session.close()
+    # если новых сообщений еще нет - ждем их появления, не удерживая соединение с базой
+    if not messages:
+        # концентратор будит раньше времени только о сообщениях, отправленных через этот процесс, поэтому
+        # по истечении времени ожидания база проверяется еще раз (сообщение могло прийти через другой процесс)
+        hub.wait(current_user.id, user_id, after_id, timeout)
+        session = create_session()
+        messages, has_more = get_chat_page(session, current_user.id, user_id, after_id=after_id, limit=limit)
+        session.close()
+    return json_response({f'chat_with_{user_id}': message_json.many(messages), 'has_more': has_more})
 
 
 @api_blueprint.route('/messages/<int:user_id>', methods=['POST'])
@@ -180,47 +421,58 @@ def post_message(current_user: User, user_id):
     """Обработчик запроса на отправление сообщений пользователю.
     :param user_id: id собеседника
     :param current_user: клиент"""
-    from main import get_rank_by_rating, count_rating_raise
     if not request.json:  # проверяем наличие данных в запросе
         abort(400)  # если данных в запросе нет - возвращаем ошибку
     msg_content = request.json.get('content')  # получаем содержание собщения в json запросе
     if not msg_content:  # проверяем налчие содержания сообщения
         abort(400)  # если содержание сообщения отсутствует - возвращаем ошибку
+    # момент подтверждения отправки при отложенной записи: после фиксации транзакции или после постановки в очередь
+    durability = request.json.get('durability', WRITE_BEHIND_DURABILITY)
     session = create_session()
-    if user_id not in [i[0] for i in
-                       session.query(User.id).all()]:  # проверяем наличие пользователя с указанным id в бд
-        abort(404)  # если такого пользователя не существует - возвращаем ошибку
-    # создаем объект содержания и заполняем его
-    cnt = Content()
-    cnt.content = msg_content
-    session.add(cnt)
-    session.commit()
-    sender = session.query(User).filter(User.id == current_user.id).first()  # получаем объект пользователя клиента
-    # рассчитываем надбавку к рейтингу
-    sender.rating += count_rating_raise(cnt.content)
-    sender.rating = round(sender.rating, 1)
-    # присваиваем пользователю ранг, опираясь на его рейтинг
-    sender.rank_id = get_rank_by_rating(sender.rating, session)
-    session.commit()
-    # создаем объект сообщения и заполняем все необходимые поля
-    msg = Message()
-    msg.content = cnt
-    msg.from_id = current_user.id
-    msg.to_id = user_id
-    session.add(msg)
-    session.commit()
+    try:  # отправляем сообщение (рейтинг и ранг клиента обновляются вместе с ним)
+        submit_message(session, current_user.id, user_id, msg_content, durability)
+    except ValueError:
+        abort(400)  # если указан неизвестный режим подтверждения - возвращаем ошибку
+    except LookupError:
+        abort(404)  # если пользователя с указанным id не существует - возвращаем ошибку
+    except WriteBehindUnavailable:
+        abort(503)  # если запись сообщения не подтверждена - просим повторить запрос позже
     return jsonify({'message': 'Success'})
 
 
+@api_blueprint.route('/messages', methods=['POST'])
+@token_required
+def post_messages(current_user: User):
+    """Обработчик запроса на пакетное отправление сообщений разным пользователям.
+    :param current_user: клиент"""
+    items = request.json.get('messages') if isinstance(request.json, dict) else None  # получаем список сообщений
+    if not isinstance(items, list) or not items or len(items) > MESSAGES_BATCH_LIMIT:  # проверяем размер пачки
+        abort(400)  # если список отсутствует, пуст или слишком велик - возвращаем ошибку
+    results = [None] * len(items)
+    to_send = []  # корректные сообщения пачки: (номер в пачке, id получателя, содержание)
+    for i, item in enumerate(items):
+        # проверяем корректность каждого сообщения
+        if isinstance(item, dict) and isinstance(item.get('to_id'), int) and item.get('content') \
+                and isinstance(item['content'], str):
+            to_send.append((i, item['to_id'], item['content']))
+        else:
+            results[i] = {'error': 'Bad Request'}
+    session = create_session()
+    # отправляем все корректные сообщения одной транзакцией
+    message_ids = send_messages(session, current_user.id, [(to_id, content) for _, to_id, content in to_send])
+    for (i, to_id, _), message_id in zip(to_send, message_ids):
+        results[i] = {'to_id': to_id, 'id': message_id} if message_id else {'to_id': to_id, 'error': 'Not Found'}
+    return jsonify({'results': results})
+
+
 @api_blueprint.route('/ads', methods=['GET'])
 @token_required
 def get_ads(current_user: User):
     """Обработчик запроса на получение актуальных объявлений.
     :param current_user: клиент"""
     session = create_session()
-    # получаем 100 последних объявлений
-    ads = reversed(sorted(session.query(Advertisement).all(), key=lambda x: x.created_at)[:100])
-    return jsonify({'ads': [ad.to_dict() for ad in ads]})
+    ads = get_latest_ads(session, 100)  # получаем 100 последних объявлений
+    return json_response({'ads': ad_json.many(ads)})
 
 
 @api_blueprint.route('/users/<int:user_id>/ads', methods=['GET'])
@@ -230,13 +482,11 @@ def get_users_ads(current_user: User, user_id):
     :param user_id: id пользователя, объявления которого нам необходимо получить
     :param current_user: клиент"""
     session = create_session()
-    # получаем объект пользователя, объявления которого нам необходимо получить по его id
-    user = session.query(User).filter(User.id == user_id).first()
-    if not user:  # проверяем существование такого пользователя
+    # проверяем существование пользователя, объявления которого нам необходимо получить
+    if session.query(User).get(user_id) is None:
         abort(404)  # если такого пользователя не существует - возвращаем ошибку
-    # получаем 100 последних объявлений пользователя
-    ads = reversed(sorted(user.advertisements, key=lambda x: x.created_at)[:100])
-    return jsonify({f'user{user_id}_ads': [ad.to_dict() for ad in ads]})
+    ads = get_latest_ads(session, 100, author_id=user_id)  # получаем 100 последних объявлений пользователя
+    return json_response({f'user{user_id}_ads': ad_json.many(ads)})
 
 
 @api_blueprint.route('/ads', methods=['POST'])
@@ -260,7 +510,7 @@ def create_ad(current_user: User):
     ad = Advertisement()
     ad.title = ad_data['title']
     ad.content = content
-    ad.author = session.query(User).filter(User.id == current_user.id).first()
+    ad.author_id = current_user.id
     try:
         ad.price = int(ad_data['price'])
     except TypeError:
@@ -276,6 +526,7 @@ def create_ad(current_user: User):
         ad.interests = interests
     session.add(ad)
     session.commit()
+    ads_feed.invalidate()
     return jsonify({'message': 'Success!'})
 
 
@@ -320,6 +571,7 @@ def edit_ad(current_user: User, ad_id):
         else:
             advertisement.interests.extend(interests)
     session.commit()
+    ads_feed.invalidate()
     return jsonify({'message': 'Success!'})
 
 
@@ -338,6 +590,7 @@ def delete_ad(current_user: User, ad_id):
         abort(403)  # если автором объявления не является клиент - возвращаем ошибку
     session.delete(advertisement)
     session.commit()
+    ads_feed.invalidate()
     return jsonify({'message': 'Success!'})
 
 
@@ -346,7 +599,7 @@ def get_interests():
     """Обработик запроса на получение всех интересов."""
     session = create_session()
     interests = session.query(Interest).all()
-    return jsonify({'interests': [interest.to_dict() for interest in interests]})
+    return json_response({'interests': interest_json.many(interests)})
 
 
 @api_blueprint.errorhandler(405)
@@ -5,3 +5,6 @@ from .models.avatars import Avatar
 from .models.advertisements import Advertisement
 from .models.interests import Interest
 from .models.ranks import Rank
+from .models.conversation import Conversation
+from .models.cache_version import CacheVersion
+from .models.rating_event import RatingEvent, RatingRollup
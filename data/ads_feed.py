@@ -0,0 +1,64 @@
+"""Лента последних объявлений на главной странице. Объявления выбираются запросом по индексу времени создания,
+а отрисованный фрагмент ленты хранится в памяти процесса, поэтому стоимость главной страницы не зависит
+от количества объявлений и не растет с числом посетителей."""
+
+import threading
+import time
+
+from flask import render_template
+from sqlalchemy.orm import Session
+
+from data.constants import ADS_FEED_SIZE, ADS_FEED_TTL
+from data.db_session import create_session
+from data.repositories import get_latest_ads
+
+
+class AdsFeed:
+    """Класс кэша ленты объявлений с ограниченным временем жизни. Лента отличается только для авторов
+    показанных объявлений (у них есть кнопки изменения и удаления), поэтому хранится не больше
+    size + 1 вариантов фрагмента: общий и по одному для каждого автора из ленты."""
+
+    def __init__(self, size: int = ADS_FEED_SIZE, ttl: float = ADS_FEED_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry = None  # (момент устаревания, id авторов объявлений ленты, {вариант: отрисованный фрагмент})
+        self._generation = 0  # номер инвалидации - ленты, загруженные до сброса, не сохраняются
+
+    def render(self, viewer_id: int = None, session: Session = None) -> str:
+        """Метод, возвращающий отрисованный фрагмент ленты для клиента.
+        Если лента устарела, последние объявления заново загружаются из базы.
+        :param viewer_id: id клиента
+        :param session: сессия базы данных (по умолчанию создается отдельная сессия)"""
+        now = time.monotonic()
+        with self._lock:
+            entry, generation = self._entry, self._generation
+            if entry and entry[0] > now:
+                variant = viewer_id if viewer_id in entry[1] else None
+                if variant in entry[2]:
+                    return entry[2][variant]
+        own_session = session is None
+        session = session or create_session()
+        ads = get_latest_ads(session, self.size)
+        author_ids = frozenset(ad.author_id for ad in ads)
+        variant = viewer_id if viewer_id in author_ids else None
+        html = render_template('ads_feed.html', ads=ads, viewer_id=variant)
+        if own_session:
+            session.close()
+        with self._lock:
+            if generation == self._generation:  # лента не сбрасывалась, пока мы ее загружали
+                if self._entry and self._entry[0] > now and self._entry[1] == author_ids:
+                    self._entry[2][variant] = html  # дополняем актуальную ленту новым вариантом
+                else:
+                    self._entry = (now + self.ttl, author_ids, {variant: html})
+        return html
+
+    def invalidate(self):
+        """Метод, сбрасывающий ленту (после создания, изменения или удаления объявления).
+        Другие процессы увидят изменения не позже чем через ttl секунд."""
+        with self._lock:
+            self._entry = None
+            self._generation += 1
+
+
+ads_feed = AdsFeed()  # лента объявлений процесса
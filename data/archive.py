@@ -0,0 +1,204 @@
+"""Архив старых сообщений. Хранится в отдельной базе данных: сообщения каждого диалога упаковываются
+в сжатые zlib сегменты, а индекс по (диалог, id последнего сообщения сегмента) позволяет быстро найти нужный."""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+import sqlalchemy.ext.declarative as dec
+from sqlalchemy import Column, Integer, LargeBinary, Index, func
+from sqlalchemy.orm import Session
+
+from data.__all_models import User, Content, Message, Conversation
+from data.constants import ARCHIVE_SEGMENT_SIZE
+from data.conversations import ordered_pair
+
+ArchiveBase = dec.declarative_base()
+
+__factory = None
+
+
+class ArchiveSegment(ArchiveBase):
+    """Класс модели сегмента архива - сжатой пачки идущих подряд старых сообщений одного диалога."""
+    __tablename__ = 'segments'  # название таблицы с моделью в базе данных архива
+    __table_args__ = (
+        Index('ix_segments_first_user_id_second_user_id_last_message_id',
+              'first_user_id', 'second_user_id', 'last_message_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # id сегмента
+    first_user_id = Column(Integer, nullable=False)  # id пользователя диалога с меньшим id
+    second_user_id = Column(Integer, nullable=False)  # id пользователя диалога с большим id
+    first_message_id = Column(Integer, nullable=False)  # id первого сообщения сегмента
+    last_message_id = Column(Integer, nullable=False)  # id последнего сообщения сегмента
+    message_count = Column(Integer, nullable=False)  # количество сообщений в сегменте
+    data = Column(LargeBinary, nullable=False)  # сжатый список сообщений сегмента
+
+    def unpack(self) -> list:
+        """Метод, распаковывающий сообщения сегмента.
+        Возвращает список кортежей (id, id отправителя, id получателя, время создания, текст)
+        в порядке возрастания id."""
+        return [(message_id, from_id, to_id, datetime.fromisoformat(created_at), text)
+                for message_id, from_id, to_id, created_at, text in json.loads(zlib.decompress(self.data))]
+
+    @staticmethod
+    def pack(rows: list) -> bytes:
+        """Метод, упаковывающий сообщения в сжатый вид.
+        :param rows: список кортежей (id, id отправителя, id получателя, время создания, текст)"""
+        return zlib.compress(json.dumps([(message_id, from_id, to_id, created_at.isoformat(), text)
+                                         for message_id, from_id, to_id, created_at, text in rows],
+                                        ensure_ascii=False).encode('utf-8'), 9)
+
+
+def archive_init(db_file):
+    """Функция, подключающая базу данных архива (и создающая ее, если она еще не существует).
+    :param db_file: путь до файла базы данных архива"""
+    global __factory
+
+    if __factory:
+        return
+
+    engine = sa.create_engine(f'sqlite:///{db_file.strip()}?check_same_thread=False', echo=False)
+    __factory = orm.sessionmaker(bind=engine)
+    ArchiveBase.metadata.create_all(engine)
+
+
+def create_archive_session():
+    """Функция, создающая сессию базы данных архива. Если архив не подключен, возвращает None."""
+    return __factory() if __factory else None
+
+
+def pair_filter(first_id: int, second_id: int):
+    """Функция, возвращающая условие выборки сегментов архива диалога.
+    :param first_id: id пользователя диалога с меньшим id
+    :param second_id: id пользователя диалога с большим id"""
+    return (ArchiveSegment.first_user_id == first_id) & (ArchiveSegment.second_user_id == second_id)
+
+
+def get_archived_messages(session: Session, user_id: int, companion_id: int, before_id: int = None,
+                          after_id: int = None, limit: int = 1) -> list:
+    """Функция, получающая сообщения диалога из архива. Если архив не подключен, возвращает пустой список.
+    Возвращает не более limit сообщений до before_id (или после after_id) в хронологическом порядке.
+    Сообщения не добавляются в сессию: они существуют только для отображения.
+    :param session: сессия основной базы данных (из нее берутся объекты отправителей)
+    :param user_id: id клиента
+    :param companion_id: id собеседника
+    :param before_id: получить сообщения, отправленные до сообщения с этим id
+    :param after_id: получить сообщения, отправленные после сообщения с этим id
+    :param limit: количество сообщений"""
+    archive_session = create_archive_session()
+    if archive_session is None or limit < 1:
+        return []
+    query = archive_session.query(ArchiveSegment).filter(pair_filter(*ordered_pair(user_id, companion_id)))
+    rows = []
+    if after_id is not None:
+        # идем по сегментам от старых к новым, начиная с сегмента, который содержит сообщения новее after_id
+        cursor = after_id
+        while len(rows) < limit:
+            segment = query.filter(ArchiveSegment.last_message_id > cursor) \
+                .order_by(ArchiveSegment.last_message_id).first()
+            if segment is None:
+                break
+            rows.extend(row for row in segment.unpack() if row[0] > after_id)
+            cursor = segment.last_message_id
+        rows = rows[:limit]
+    else:
+        # идем по сегментам от новых к старым, начиная с сегмента, который содержит сообщения старше before_id
+        cursor = before_id
+        while len(rows) < limit:
+            segments = query if cursor is None else query.filter(ArchiveSegment.first_message_id < cursor)
+            segment = segments.order_by(ArchiveSegment.last_message_id.desc()).first()
+            if segment is None:
+                break
+            rows = [row for row in segment.unpack() if before_id is None or row[0] < before_id] + rows
+            cursor = segment.first_message_id
+        rows = rows[-limit:]
+    archive_session.close()
+    users = {user.id: user for user in session.query(User).filter(User.id.in_({user_id, companion_id}))}
+    messages = []
+    for message_id, from_id, to_id, created_at, text in rows:
+        msg = Message(id=message_id, from_id=from_id, to_id=to_id, created_at=created_at)
+        msg.content = Content(content=text)
+        msg.sender = users.get(from_id)
+        messages.append(msg)
+    return messages
+
+
+def archive_old_messages(session: Session, archive_session, older_than_days: int,
+                         segment_size: int = ARCHIVE_SEGMENT_SIZE, progress=None) -> int:
+    """Функция, переносящая сообщения старше указанного возраста в архив. Возвращает количество перенесенных сообщений.
+    Последнее сообщение каждого диалога всегда остается в основной базе (на него ссылается список чатов).
+    Сегмент сначала фиксируется в архиве и лишь затем удаляется из основной базы, поэтому прерванный запуск
+    можно безопасно повторить.
+    :param session: сессия основной базы данных
+    :param archive_session: сессия базы данных архива
+    :param older_than_days: возраст сообщений в днях
+    :param segment_size: максимальное количество сообщений в сегменте
+    :param progress: функция, вызываемая после каждого сегмента с количеством уже перенесенных сообщений"""
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    archived = 0
+    pairs = session.query(Conversation.first_user_id, Conversation.second_user_id, Conversation.last_message_id).all()
+    for first_id, second_id, last_message_id in pairs:
+        dialog = ((Message.from_id == first_id) & (Message.to_id == second_id)) | \
+                 ((Message.from_id == second_id) & (Message.to_id == first_id))
+        # сообщения, которые уже есть в архиве (после прерванного запуска), просто удаляем из основной базы
+        archived_up_to = archive_session.query(func.max(ArchiveSegment.last_message_id)) \
+            .filter(pair_filter(first_id, second_id)).scalar() or 0
+        remove_messages(session, Message.id.in_(
+            archived_ids(archive_session, first_id, second_id,
+                         [message_id for message_id, in session.query(Message.id)
+                          .filter(dialog, Message.id <= archived_up_to)])))
+        while True:
+            # берем сообщения подряд по id и останавливаемся на первом, которое еще не устарело (его время
+            # могло оказаться больше времени следующих сообщений), чтобы в архив попадали только сообщения
+            # без пропусков и ни одно сообщение не было удалено, не попав в архив
+            rows = session.query(Message.id, Message.from_id, Message.to_id, Message.created_at, Content.content) \
+                .outerjoin(Content, Content.id == Message.content_id) \
+                .filter(dialog, Message.id > archived_up_to, Message.id != last_message_id) \
+                .order_by(Message.id).limit(segment_size).all()
+            fresh = next((i for i, row in enumerate(rows) if row[3] is None or row[3] >= cutoff), None)
+            complete = fresh is None and len(rows) == segment_size  # могут остаться еще устаревшие сообщения
+            rows = rows if fresh is None else rows[:fresh]
+            if not rows:
+                break
+            archive_session.add(ArchiveSegment(first_user_id=first_id, second_user_id=second_id,
+                                               first_message_id=rows[0][0], last_message_id=rows[-1][0],
+                                               message_count=len(rows), data=ArchiveSegment.pack(rows)))
+            archive_session.commit()
+            archived_up_to = rows[-1][0]
+            remove_messages(session, Message.id.in_([row[0] for row in rows]))  # удаляем только записанные в архив
+            archived += len(rows)
+            if progress:
+                progress(archived)
+            if not complete:
+                break
+    return archived
+
+
+def archived_ids(archive_session, first_id: int, second_id: int, message_ids: list) -> list:
+    """Функция, возвращающая те из указанных сообщений диалога, которые действительно хранятся в сегментах архива.
+    :param archive_session: сессия базы данных архива
+    :param first_id: id пользователя диалога с меньшим id
+    :param second_id: id пользователя диалога с большим id
+    :param message_ids: id сообщений"""
+    if not message_ids:
+        return []
+    segments = archive_session.query(ArchiveSegment).filter(
+        pair_filter(first_id, second_id), ArchiveSegment.last_message_id >= min(message_ids),
+        ArchiveSegment.first_message_id <= max(message_ids))
+    stored = {row[0] for segment in segments for row in segment.unpack()}
+    return [message_id for message_id in message_ids if message_id in stored]
+
+
+def remove_messages(session: Session, condition):
+    """Функция, удаляющая из основной базы сообщения вместе с их содержанием.
+    :param session: сессия основной базы данных
+    :param condition: условие выборки удаляемых сообщений"""
+    content_ids = [content_id for content_id, in session.query(Message.content_id).filter(condition)]
+    if not content_ids:
+        return
+    session.query(Message).filter(condition).delete(synchronize_session=False)
+    session.query(Content).filter(Content.id.in_(content_ids)).delete(synchronize_session=False)
+    session.commit()
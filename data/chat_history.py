@@ -0,0 +1,60 @@
+from sqlalchemy.orm import Session, joinedload
+
+from data.__all_models import Message
+from data.archive import get_archived_messages
+from data.constants import MESSAGES_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE
+
+
+def parse_page_args(args) -> tuple:
+    """Функция, получающая параметры страницы переписки из параметров запроса.
+    Возвращает кортеж (before_id, after_id, limit), при некорректных параметрах вызывает ValueError.
+    :param args: параметры запроса"""
+    before_id, after_id = args.get('before_id'), args.get('after_id')
+    before_id = int(before_id) if before_id else None
+    after_id = int(after_id) if after_id else None
+    if before_id is not None and after_id is not None:  # курсоры в обе стороны одновременно не поддерживаются
+        raise ValueError('before_id and after_id are mutually exclusive')
+    limit = int(args.get('limit') or MESSAGES_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return before_id, after_id, min(limit, MESSAGES_MAX_PAGE_SIZE)
+
+
+def get_chat_page(session: Session, user_id: int, companion_id: int, before_id: int = None, after_id: int = None,
+                  limit: int = MESSAGES_PAGE_SIZE) -> tuple:
+    """Функция, получающая одну страницу переписки двух пользователей.
+    Возвращает кортеж (сообщения в хронологическом порядке, есть ли еще сообщения в направлении выборки).
+    :param session: сессия базы данных
+    :param user_id: id клиента
+    :param companion_id: id собеседника
+    :param before_id: получить сообщения, отправленные до сообщения с этим id
+    :param after_id: получить сообщения, отправленные после сообщения с этим id
+    :param limit: количество сообщений на странице"""
+    messages = []
+    # выбираем отдельно сообщения каждого из направлений переписки: так каждый запрос - ограниченный проход
+    # по индексу (from_id, to_id, id), а не чтение всей истории чата с последующей сортировкой
+    for from_id, to_id in ((user_id, companion_id), (companion_id, user_id)):
+        query = session.query(Message).filter(Message.from_id == from_id, Message.to_id == to_id) \
+            .options(joinedload(Message.sender), joinedload(Message.content))
+        if after_id is not None:
+            query = query.filter(Message.id > after_id).order_by(Message.id)
+        else:
+            if before_id is not None:
+                query = query.filter(Message.id < before_id)
+            query = query.order_by(Message.id.desc())
+        messages.extend(query.limit(limit + 1).all())
+    # старые сообщения могут быть перенесены в архив: добираем из него недостающие сообщения страницы.
+    # в архиве лежат только сообщения старше всех оставшихся в основной базе, поэтому при выборке назад
+    # к нему обращаемся, лишь когда основная база исчерпана, а при выборке вперед - он дает начало страницы
+    if after_id is not None:
+        messages.extend(get_archived_messages(session, user_id, companion_id, after_id=after_id, limit=limit + 1))
+    elif len(messages) <= limit:
+        oldest_id = min([msg.id for msg in messages] + ([before_id] if before_id is not None else []), default=None)
+        messages.extend(get_archived_messages(session, user_id, companion_id, before_id=oldest_id,
+                                              limit=limit + 1 - len(messages)))
+    # объединяем выборки: более новые сообщения берем от курсора вперед, более старые - от курсора назад
+    messages.sort(key=lambda msg: msg.id, reverse=after_id is None)
+    page = messages[:limit]
+    if after_id is None:
+        page.reverse()
+    return page, len(messages) > limit
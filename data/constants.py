@@ -29,3 +29,58 @@ RATE = {
     2000: 25,
     5000: 50
 }
+
+MESSAGES_PAGE_SIZE = 50  # количество сообщений на одной странице чата
+MESSAGES_MAX_PAGE_SIZE = 200  # максимальное количество сообщений, которое можно запросить за раз
+MESSAGES_BATCH_LIMIT = 500  # максимальное количество сообщений в одном пакетном запросе API
+SEARCH_PAGE_SIZE = 20  # количество результатов поиска по сообщениям на одной странице
+
+SSE_KEEPALIVE = 15  # интервал (в секундах) между служебными сообщениями в потоке событий чата
+LONG_POLL_TIMEOUT = 25  # максимальное время (в секундах) ожидания новых сообщений в API
+
+ARCHIVE_DB_FILE = 'db/archive.sqlite'  # файл базы данных архива старых сообщений
+ARCHIVE_AFTER_DAYS = 365  # возраст (в днях), после которого сообщения переносятся в архив
+ARCHIVE_SEGMENT_SIZE = 200  # максимальное количество сообщений в одном сжатом сегменте архива
+
+WRITE_BEHIND_ENABLED = False  # отправлять сообщения через очередь отложенной записи с групповой фиксацией
+WRITE_BEHIND_BATCH_SIZE = 256  # максимальное количество сообщений, фиксируемых одной транзакцией
+WRITE_BEHIND_MAX_DELAY = 0.005  # максимальное время (в секундах) накопления пачки перед фиксацией
+WRITE_BEHIND_QUEUE_SIZE = 10000  # максимальное количество сообщений, ожидающих записи
+WRITE_BEHIND_TIMEOUT = 5  # максимальное время (в секундах) ожидания подтверждения записи сообщения
+WRITE_BEHIND_RETRIES = 3  # количество повторов транзакции с пачкой сообщений, если она не удалась
+WRITE_BEHIND_RETRY_DELAY = 0.2  # задержка (в секундах) перед первым повтором, с каждым повтором растет
+# подтверждение записи по умолчанию: 'committed' - после фиксации транзакции, 'queued' - после постановки в очередь
+WRITE_BEHIND_DURABILITY = 'committed'
+
+RECOMPUTE_CHUNK_SIZE = 50000  # количество сообщений, читаемых за раз при пересчете рейтинга
+
+TOP_SIZE = 100  # количество пользователей на доске почета
+
+RATING_ROLLUP_INTERVAL = 300  # интервал (в секундах) между свертками событий изменения рейтинга
+RATING_WINDOWS = ('day', 'week', 'month')  # промежутки времени, за которые строится доска почета
+
+USER_CACHE_TTL = 30  # время (в секундах), в течение которого процесс использует загруженный объект пользователя
+USER_CACHE_SIZE = 10000  # максимальное количество пользователей в кэше процесса
+
+ACCESS_TOKEN_LIFETIME = 3600  # время (в секундах) действия токена API
+REFRESH_TOKEN_LIFETIME = 30 * 24 * 3600  # время (в секундах) действия токена обновления
+TOKEN_CACHE_SIZE = 10000  # максимальное количество проверенных токенов в кэше процесса
+
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:150000'  # алгоритм и стоимость хэширования паролей
+PASSWORD_POOL_WORKERS = 2  # количество процессов хэширования паролей (0 - хэшировать в потоке запроса)
+PASSWORD_POOL_MAX_PENDING = 32  # максимальное количество операций с паролями, ожидающих выполнения
+PASSWORD_TIMEOUT = 10  # максимальное время (в секундах) ожидания хэширования или проверки пароля
+
+USER_IMPORT_CHUNK_SIZE = 1000  # количество пользователей, записываемых одной транзакцией при импорте
+USER_IMPORT_WORKERS = 0  # количество процессов хэширования паролей при импорте (0 - по количеству процессоров)
+USER_EXPORT_CHUNK_SIZE = 1000  # количество пользователей, читаемых за раз при экспорте
+
+TYPEAHEAD_LIMIT = 10  # максимальное количество подсказок при вводе в поиске пользователей
+TYPEAHEAD_SYNC_INTERVAL = 5  # интервал (в секундах) между сверками версии индекса подсказок процесса
+
+USERS_PAGE_SIZE = 100  # количество пользователей на одной странице списка пользователей в API
+USERS_MAX_PAGE_SIZE = 1000  # максимальное количество пользователей, которое можно запросить за раз
+USERS_STREAM_CHUNK_SIZE = 500  # количество пользователей, читаемых за раз при потоковой выдаче списка
+
+ADS_FEED_SIZE = 6  # количество объявлений в ленте на главной странице
+ADS_FEED_TTL = 10  # время (в секундах), в течение которого процесс использует отрисованную ленту объявлений
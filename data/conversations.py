@@ -0,0 +1,125 @@
+from sqlalchemy import bindparam, func, literal, select
+from sqlalchemy.orm import Session, joinedload
+
+from data.__all_models import Conversation, Message
+
+
+def ordered_pair(user_id: int, companion_id: int) -> tuple:
+    """Функция, возвращающая пару id пользователей в том порядке, в котором она хранится в таблице диалогов.
+    :param user_id: id первого пользователя
+    :param companion_id: id второго пользователя"""
+    return min(user_id, companion_id), max(user_id, companion_id)
+
+
+def register_message(session: Session, msg: Message):
+    """Функция, обновляющая диалог отправителя и получателя после добавления нового сообщения.
+    Изменения не фиксируются: они попадают в ту же транзакцию, что и само сообщение.
+    :param session: сессия базы данных, в которой было добавлено сообщение
+    :param msg: новое сообщение"""
+    session.flush()  # получаем id и время создания сообщения
+    register_messages(session, [(msg.id, msg.from_id, msg.to_id, msg.created_at)])
+
+
+def register_messages(session: Session, messages: list):
+    """Функция, обновляющая диалоги после добавления пачки новых сообщений.
+    Для всех диалогов выполняется по одному пакетному INSERT и UPDATE; изменения не фиксируются.
+    :param session: сессия базы данных, в которой были добавлены сообщения
+    :param messages: список кортежей (id сообщения, id отправителя, id получателя, время создания)"""
+    conversations = {}
+    for message_id, from_id, to_id, created_at in sorted(messages):
+        first_id, second_id = ordered_pair(from_id, to_id)
+        conv = conversations.setdefault((first_id, second_id), {'b_first_id': first_id, 'b_second_id': second_id,
+                                                                'b_first_unread': 0, 'b_second_unread': 0})
+        conv['b_last_message_id'], conv['b_last_activity'] = message_id, created_at
+        # считаем непрочитанные сообщения получателя (сообщения самому себе считаются прочитанными)
+        if from_id != to_id:
+            conv['b_first_unread' if to_id == first_id else 'b_second_unread'] += 1
+    if not conversations:
+        return
+    table = Conversation.__table__
+    # создаем диалоги, которых еще нет (при одновременной отправке первых сообщений дубликат просто игнорируется)
+    session.execute(table.insert().prefix_with('OR IGNORE'),
+                    [{'first_user_id': first_id, 'second_user_id': second_id, 'first_unread': 0, 'second_unread': 0,
+                      'first_last_read_id': 0, 'second_last_read_id': 0} for first_id, second_id in conversations])
+    # счетчики увеличиваем на стороне базы, чтобы не потерять одновременные обновления
+    session.execute(table.update()
+                    .where((table.c.first_user_id == bindparam('b_first_id')) &
+                           (table.c.second_user_id == bindparam('b_second_id')))
+                    .values(last_message_id=bindparam('b_last_message_id'),
+                            last_activity=bindparam('b_last_activity'),
+                            first_unread=table.c.first_unread + bindparam('b_first_unread'),
+                            second_unread=table.c.second_unread + bindparam('b_second_unread')),
+                    list(conversations.values()))
+
+
+def mark_conversation_read(session: Session, user_id: int, companion_id: int, up_to_id: int = None):
+    """Функция, отмечающая сообщения диалога прочитанными пользователем одним UPDATE.
+    Сдвигает отметку последнего прочитанного сообщения и пересчитывает счетчик непрочитанных.
+    :param session: сессия базы данных
+    :param user_id: id пользователя, прочитавшего сообщения
+    :param companion_id: id собеседника
+    :param up_to_id: id сообщения, до которого включительно диалог прочитан (по умолчанию - весь диалог)"""
+    first_id, second_id = ordered_pair(user_id, companion_id)
+    side = 'first' if user_id == first_id else 'second'
+    table = Conversation.__table__
+    unread, last_read = table.c[f'{side}_unread'], table.c[f'{side}_last_read_id']
+    query = table.update().where((table.c.first_user_id == first_id) & (table.c.second_user_id == second_id))
+    if up_to_id is None:
+        # изменяем строку только если в ней есть непрочитанные сообщения
+        query = query.where(unread > 0).values({last_read: table.c.last_message_id, unread: 0})
+    else:
+        # непрочитанными остаются сообщения собеседника новее отметки (ограниченный проход по индексу сообщений)
+        newer = select([func.count(Message.id)]).where((Message.from_id == companion_id) &
+                                                       (Message.to_id == user_id) &
+                                                       (Message.id > up_to_id)).as_scalar()
+        up_to_id = func.min(up_to_id, table.c.last_message_id)  # отметка не может опережать последнее сообщение
+        query = query.where(last_read < up_to_id).values({last_read: up_to_id, unread: newer})
+    session.execute(query)
+    session.commit()
+
+
+def get_conversation(session: Session, user_id: int, companion_id: int):
+    """Функция, получающая диалог двух пользователей.
+    :param session: сессия базы данных
+    :param user_id: id первого пользователя
+    :param companion_id: id второго пользователя"""
+    first_id, second_id = ordered_pair(user_id, companion_id)
+    return session.query(Conversation).filter(Conversation.first_user_id == first_id,
+                                              Conversation.second_user_id == second_id).first()
+
+
+def get_conversations(session: Session, user_id: int) -> list:
+    """Функция, получающая все диалоги пользователя, упорядоченные по времени последней активности.
+    :param session: сессия базы данных
+    :param user_id: id пользователя"""
+    return session.query(Conversation).filter((Conversation.first_user_id == user_id) |
+                                              (Conversation.second_user_id == user_id)) \
+        .options(joinedload(Conversation.first_user), joinedload(Conversation.second_user),
+                 joinedload(Conversation.last_message).joinedload(Message.content)) \
+        .order_by(Conversation.last_activity.desc()).all()
+
+
+def backfill_conversations(session: Session) -> int:
+    """Функция, заново строящая таблицу диалогов по таблице сообщений.
+    Все сообщения при этом отмечаются прочитанными. Возвращает количество построенных диалогов.
+    :param session: сессия базы данных"""
+    # для каждой пары собеседников находим id последнего сообщения
+    pairs = select([func.min(Message.from_id, Message.to_id).label('first_user_id'),
+                    func.max(Message.from_id, Message.to_id).label('second_user_id'),
+                    func.max(Message.id).label('last_message_id')]) \
+        .group_by(func.min(Message.from_id, Message.to_id), func.max(Message.from_id, Message.to_id)).alias('pairs')
+    # время последней активности берем из последнего сообщения пары
+    # все сообщения считаются прочитанными
+    # (повторяющимся столбцам нужны собственные имена, иначе select оставит только первый из них)
+    rows = select([pairs.c.first_user_id, pairs.c.second_user_id, pairs.c.last_message_id, Message.created_at,
+                   literal(0).label('first_unread'), literal(0).label('second_unread'),
+                   pairs.c.last_message_id.label('first_last_read_id'),
+                   pairs.c.last_message_id.label('second_last_read_id')]) \
+        .select_from(pairs.join(Message.__table__, Message.id == pairs.c.last_message_id))
+    table = Conversation.__table__
+    session.execute(table.delete())
+    session.execute(table.insert().from_select(['first_user_id', 'second_user_id', 'last_message_id', 'last_activity',
+                                                'first_unread', 'second_unread', 'first_last_read_id',
+                                                'second_last_read_id'], rows))
+    session.commit()
+    return session.query(Conversation).count()
@@ -6,6 +6,7 @@ from wtforms.validators import DataRequired, EqualTo, Length, ValidationError
 from flask_wtf import FlaskForm
 
 from data.db_session import create_session
+from data.repositories import email_taken, phone_taken
 from data.__all_models import *
 
 REQ_MESSAGE = 'Не все поля заполнены'
@@ -48,14 +49,18 @@ class RegistrationForm(FlaskForm):
         """Метод, проверяющий уникальность введенных данных в поле для телефона
         :param field: поле, которое необходимо проверить"""
         session = create_session()
-        if field.data in [phone[0] for phone in session.query(User.phone_number).all()]:
+        taken = phone_taken(session, field.data)  # ищем номер по индексу нормализованных номеров
+        session.close()
+        if taken:
             raise ValidationError('Пользователь с таким номером телефона уже существует')
 
     def validate_email_field(self, field: EmailField):
         """Метод, проверяющий уникальность введенных данных в поле для email
         :param field: поле, которое необходимо проверить"""
         session = create_session()
-        if field.data in [email[0] for email in session.query(User.email).all()]:
+        taken = email_taken(session, field.data)  # ищем адрес по индексу нормализованных адресов
+        session.close()
+        if taken:
             raise ValidationError('Пользователь с таким  адресом эл. почты уже существует')
 
 
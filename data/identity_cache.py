@@ -0,0 +1,66 @@
+"""Кэш пользователей процесса. Запросы клиента (страницы через load_user и API через token_required)
+получают объект клиента из памяти, а не загружают его заново из базы на каждый запрос."""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from data.__all_models import User
+from data.constants import USER_CACHE_TTL, USER_CACHE_SIZE
+from data.db_session import create_session
+from data.repositories import user_options
+
+
+class UserCache:
+    """Класс кэша пользователей с ограниченным временем жизни записей и вытеснением давно не использованных.
+    Объекты пользователей в кэше не привязаны к сессии, могут отставать от базы на время жизни записи
+    и используются только для чтения; чтобы изменить клиента, обработчик заново загружает его в своей сессии."""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # {id пользователя: (момент устаревания записи, объект пользователя)}
+
+    def get(self, user_id: int, session: Session = None):
+        """Метод, возвращающий пользователя по id (None, если пользователь не найден).
+        Если пользователя нет в кэше или запись устарела, он загружается из базы вместе с рангом и интересами.
+        :param user_id: id пользователя
+        :param session: сессия базы данных (по умолчанию создается отдельная сессия)"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and entry[0] > now:
+                self._users.move_to_end(user_id)  # отмечаем запись как недавно использованную
+                return entry[1]
+        own_session = session is None
+        session = session or create_session()
+        user = session.query(User).options(*user_options()).filter(User.id == user_id).first()
+        if user is not None:
+            session.expunge(user)  # отвязываем объект от сессии, чтобы его можно было использовать в других запросах
+            with self._lock:
+                self._users[user_id] = (now + self.ttl, user)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_size:  # вытесняем давно не использованных пользователей
+                    self._users.popitem(last=False)
+        if own_session:
+            session.close()
+        return user
+
+    def invalidate(self, user_id: int):
+        """Метод, удаляющий пользователя из кэша (после изменения его профиля, рейтинга или пароля).
+        Другие процессы увидят изменения не позже чем через ttl секунд.
+        :param user_id: id пользователя"""
+        with self._lock:
+            self._users.pop(int(user_id), None)
+
+    def clear(self):
+        """Метод, очищающий кэш."""
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()  # кэш пользователей процесса
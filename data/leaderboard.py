@@ -0,0 +1,131 @@
+"""Доска почета. Пользователи упорядочены по убыванию рейтинга, а при равном рейтинге - по возрастанию id
+(пользователи без рейтинга стоят в конце)."""
+
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from data.__all_models import User, CacheVersion
+from data.constants import TOP_SIZE
+from data.ranks import rank_table
+
+TOP_CACHE = 'top'  # название кэша доски почета в таблице версий кэшей
+
+# строка доски почета
+TopEntry = namedtuple('TopEntry', ('id', 'name', 'surname', 'rating', 'rank'))
+
+
+def get_leaderboard_position(session: Session, user: User) -> int:
+    """Функция, возвращающая место пользователя на доске почета.
+    Место считается двумя ограниченными проходами по индексу (rating, id): количество пользователей
+    с большим рейтингом и количество пользователей с таким же рейтингом, но меньшим id.
+    :param session: сессия базы данных
+    :param user: пользователь"""
+    if user.rating is None:
+        higher = User.rating.isnot(None)
+        tied = User.rating.is_(None) & (User.id < user.id)
+    else:
+        higher = User.rating > user.rating
+        tied = (User.rating == user.rating) & (User.id < user.id)
+    ahead = select([func.count()]).where(higher).as_scalar() + select([func.count()]).where(tied).as_scalar()
+    return session.execute(select([ahead])).scalar() + 1
+
+
+def bump_version(session: Session, name: str) -> int:
+    """Функция, увеличивающая версию кэша и возвращающая новую версию. Изменения не фиксируются:
+    версия меняется в той же транзакции, что и данные, и до ее фиксации строка версии заблокирована.
+    :param session: сессия базы данных
+    :param name: название кэша"""
+    session.execute(text('INSERT INTO cache_versions (name, version) VALUES (:name, 1) '
+                         'ON CONFLICT (name) DO UPDATE SET version = version + 1'), {'name': name})
+    return session.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+
+
+def get_version(session: Session, name: str) -> int:
+    """Функция, возвращающая текущую версию кэша (поиск по первичному ключу).
+    :param session: сессия базы данных
+    :param name: название кэша"""
+    return session.query(CacheVersion.version).filter(CacheVersion.name == name).scalar() or 0
+
+
+class TopCache:
+    """Класс кэша доски почета: первые size пользователей с положительным рейтингом.
+    Каждый процесс хранит свою копию и сверяет ее версию с таблицей версий кэшей: изменения, сделанные
+    этим процессом, применяются к копии на месте, а о чужих изменениях копия узнает по версии и перестраивается."""
+
+    def __init__(self, size: int = TOP_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = []  # строки доски почета в порядке мест
+        self._version = None  # версия, которой соответствует копия (None - копия не построена)
+
+    def get(self, session: Session) -> list:
+        """Метод, возвращающий строки доски почета. Обращается к базе только за версией кэша,
+        если копия процесса не устарела.
+        :param session: сессия базы данных"""
+        version = get_version(session, TOP_CACHE)
+        with self._lock:
+            if self._version == version:
+                return self._entries
+        return self.reload(session, version)
+
+    def reload(self, session: Session, version: int) -> list:
+        """Метод, заново строящий копию доски почета по базе данных.
+        :param session: сессия базы данных
+        :param version: версия кэша, прочитанная до построения"""
+        rows = session.query(User.id, User.name, User.surname, User.rating, User.rank_id) \
+            .filter(User.rating > 0).order_by(User.rating.desc(), User.id).limit(self.size).all()
+        entries = [TopEntry(user_id, name, surname, rating, rank_table.get_rank_title(rank_id, session))
+                   for user_id, name, surname, rating, rank_id in rows]
+        with self._lock:
+            self._entries, self._version = entries, version
+        return entries
+
+    def touch(self, session: Session, rating: float):
+        """Метод, отмечающий изменение рейтинга пользователя в текущей транзакции.
+        Версия кэша увеличивается, только если новый рейтинг может попасть на доску почета.
+        Возвращает новую версию или None, если версия не менялась.
+        :param session: сессия базы данных
+        :param rating: новый рейтинг пользователя"""
+        with self._lock:
+            entries, loaded = self._entries, self._version is not None
+        # рейтинги при отправке сообщений только растут, поэтому порог доски почета не может стать ниже
+        if rating <= 0 or loaded and len(entries) == self.size and rating < entries[-1].rating:
+            return None
+        return bump_version(session, TOP_CACHE)
+
+    def apply(self, session: Session, user_id: int, rating: float, version: int):
+        """Метод, применяющий к копии процесса изменение рейтинга, зафиксированное с указанной версией.
+        Если копия успела отстать (изменения других процессов), она будет перестроена при следующем чтении.
+        :param session: сессия базы данных
+        :param user_id: id пользователя
+        :param rating: новый рейтинг пользователя
+        :param version: версия кэша, полученная при изменении рейтинга"""
+        with self._lock:
+            if self._version is None or self._version != version - 1:
+                self._version = None  # копия отстала - перестраиваем ее при следующем чтении
+                return
+            entries = [entry for entry in self._entries if entry.id != user_id]
+            current = next((entry for entry in self._entries if entry.id == user_id), None)
+        if current is None:  # пользователь только попадает на доску почета - получаем его имя
+            current = TopEntry(user_id, *session.query(User.name, User.surname).filter(User.id == user_id).one(),
+                               rating, None)
+        entries.append(current._replace(rating=rating,
+                                        rank=rank_table.get_rank_title(rank_table.get_rank_id(rating, session))))
+        entries.sort(key=lambda entry: (-entry.rating, entry.id))
+        with self._lock:
+            if self._version == version - 1:
+                self._entries, self._version = entries[:self.size], version
+            else:
+                self._version = None
+
+    def invalidate(self, session: Session):
+        """Метод, отмечающий доску почета устаревшей во всех процессах (например, после изменения имени
+        пользователя или пересчета рейтингов). Изменения не фиксируются.
+        :param session: сессия базы данных"""
+        bump_version(session, TOP_CACHE)
+
+
+top_cache = TopCache()  # кэш доски почета процесса
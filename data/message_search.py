@@ -0,0 +1,55 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session, joinedload
+
+from data.__all_models import Message
+from data.constants import SEARCH_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE
+
+# поиск по полнотекстовому индексу сообщений: сначала отбираем совпадения в индексе, затем оставляем только
+# сообщения из диалогов пользователя и упорядочиваем их по релевантности (bm25)
+SEARCH_QUERY = text("SELECT messages.id FROM messages_fts JOIN messages ON messages.id = messages_fts.rowid "
+                    "WHERE messages_fts MATCH :query AND (messages.from_id = :user_id OR messages.to_id = :user_id) "
+                    "ORDER BY bm25(messages_fts), messages.id DESC LIMIT :limit OFFSET :offset")
+
+
+def build_match_query(query: str) -> str:
+    """Функция, преобразующая введенный пользователем текст в запрос FTS5.
+    Каждое слово ищется как есть (спецсимволы синтаксиса FTS5 экранируются), последнее - по префиксу.
+    :param query: поисковый запрос пользователя"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def parse_search_args(args) -> tuple:
+    """Функция, получающая параметры поиска из параметров запроса.
+    Возвращает кортеж (запрос, номер страницы, количество результатов на странице),
+    при некорректных параметрах вызывает ValueError.
+    :param args: параметры запроса"""
+    page = int(args.get('page') or 1)
+    limit = int(args.get('limit') or SEARCH_PAGE_SIZE)
+    if page < 1 or limit < 1:
+        raise ValueError('page and limit must be positive')
+    return args.get('q', '').strip(), page, min(limit, MESSAGES_MAX_PAGE_SIZE)
+
+
+def search_messages(session: Session, user_id: int, query: str, page: int = 1,
+                    limit: int = SEARCH_PAGE_SIZE) -> tuple:
+    """Функция, ищущая сообщения по тексту среди диалогов пользователя.
+    Возвращает кортеж (найденные сообщения в порядке релевантности, есть ли следующая страница результатов).
+    :param session: сессия базы данных
+    :param user_id: id пользователя
+    :param query: поисковый запрос
+    :param page: номер страницы результатов (начиная с 1)
+    :param limit: количество результатов на странице"""
+    match = build_match_query(query)
+    if not match:
+        return [], False
+    ids = [row[0] for row in session.execute(SEARCH_QUERY, {'query': match, 'user_id': user_id,
+                                                            'limit': limit + 1, 'offset': (page - 1) * limit})]
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    # загружаем найденные сообщения вместе с участниками и содержанием и восстанавливаем порядок релевантности
+    messages = {msg.id: msg for msg in session.query(Message).filter(Message.id.in_(ids))
+                .options(joinedload(Message.sender), joinedload(Message.receiver), joinedload(Message.content))}
+    return [messages[message_id] for message_id in ids], has_more
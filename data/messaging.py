@@ -0,0 +1,132 @@
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from data.__all_models import User, Content, Message
+from data.constants import RATE
+from data.conversations import register_message, register_messages
+from data.notifications import hub
+from data.identity_cache import user_cache
+from data.leaderboard import top_cache
+from data.ranks import rank_table
+from data.rating_rollups import log_rating_change
+
+
+def count_rating_raise(content: str) -> int:
+    """Функция, рассчитывающая надбавку к рейтингу за сообщение.
+    :param content: текст сообщения"""
+    to_rate = len(content)
+    overall_raise = 0
+    for i in reversed(RATE.keys()):
+        if i != 1:
+            while to_rate >= i:
+                overall_raise += RATE[i]
+                to_rate -= i
+    overall_raise += (to_rate % 10) / 10
+    return overall_raise
+
+
+def raise_rating(session: Session, user_id: int, rating_raise: float) -> tuple:
+    """Функция, увеличивающая рейтинг пользователя и обновляющая его ранг. Изменения не фиксируются.
+    Возвращает кортеж (id пользователя, новый рейтинг, версия кэша доски почета), который после фиксации
+    передается в apply_rating_changes.
+    :param session: сессия базы данных
+    :param user_id: id пользователя
+    :param rating_raise: надбавка к рейтингу"""
+    users = User.__table__
+    # увеличиваем рейтинг одним UPDATE, чтобы одновременные отправки не затирали надбавки друг друга
+    session.execute(users.update().where(users.c.id == user_id)
+                    .values(rating=func.round(users.c.rating + rating_raise, 1)))
+    # присваиваем пользователю ранг, опираясь на его новый рейтинг (строка уже заблокирована транзакцией);
+    # ранг находится по таблице рангов в памяти, без запросов к базе
+    rating = session.query(User.rating).filter(User.id == user_id).scalar()
+    session.execute(users.update().where(users.c.id == user_id)
+                    .values(rank_id=rank_table.get_rank_id(rating, session)))
+    log_rating_change(session, user_id, rating_raise)  # записываем изменение в журнал рейтинга
+    return user_id, rating, top_cache.touch(session, rating)  # отмечаем изменение доски почета
+
+
+def apply_rating_changes(session: Session, changes: list):
+    """Функция, применяющая зафиксированные изменения рейтинга к кэшам процесса: доске почета и кэшу пользователей.
+    :param session: сессия базы данных
+    :param changes: список кортежей, возвращенных raise_rating"""
+    for user_id, rating, version in changes:
+        user_cache.invalidate(user_id)
+        if version is not None:
+            top_cache.apply(session, user_id, rating, version)
+
+
+def send_message(session: Session, sender_id: int, to_id: int, text: str) -> Message:
+    """Функция, отправляющая сообщение: сохраняет его содержание, само сообщение, обновляет диалог и рейтинг
+    отправителя в одной транзакции, после чего оповещает подписчиков чата.
+    Если получателя не существует, вызывает LookupError.
+    :param session: сессия базы данных
+    :param sender_id: id отправителя
+    :param to_id: id получателя
+    :param text: текст сообщения"""
+    if session.query(User).get(to_id) is None:  # проверяем наличие получателя по первичному ключу
+        raise LookupError(f'User {to_id} not found')
+    # создаем объекты содержания и сообщения
+    msg = Message()
+    msg.content = Content(content=text)
+    msg.from_id = sender_id
+    msg.to_id = to_id
+    session.add(msg)
+    register_message(session, msg)  # обновляем диалог отправителя и получателя
+    change = raise_rating(session, sender_id, count_rating_raise(text))  # увеличиваем рейтинг отправителя
+    message_id = msg.id
+    session.commit()  # фиксируем все изменения одной транзакцией
+    hub.publish(sender_id, to_id, message_id)  # оповещаем подписчиков чата о новом сообщении
+    apply_rating_changes(session, [change])  # обновляем доску почета и кэш пользователей процесса
+    return msg
+
+
+def send_messages(session: Session, sender_id: int, items: list) -> list:
+    """Функция, отправляющая пачку сообщений одной транзакцией.
+    Получатели проверяются одним запросом, содержания и сообщения добавляются пакетными INSERT, а рейтинг
+    отправителя увеличивается один раз на суммарную надбавку. Возвращает список id отправленных сообщений
+    в порядке элементов пачки (None для сообщений, получатель которых не найден).
+    :param session: сессия базы данных
+    :param sender_id: id отправителя
+    :param items: список кортежей (id получателя, текст сообщения)"""
+    return store_messages(session, [(sender_id, to_id, text) for to_id, text in items])
+
+
+def store_messages(session: Session, items: list) -> list:
+    """Функция, сохраняющая пачку сообщений от разных отправителей одной транзакцией.
+    Рейтинг каждого отправителя увеличивается один раз на суммарную надбавку за его сообщения.
+    Возвращает список id сохраненных сообщений в порядке элементов пачки (None для сообщений,
+    получатель которых не найден).
+    :param session: сессия базы данных
+    :param items: список кортежей (id отправителя, id получателя, текст сообщения)"""
+    recipients = {user_id for user_id, in session.query(User.id).filter(User.id.in_({to_id for _, to_id, _ in items}))}
+    accepted = [(i, sender_id, to_id, text) for i, (sender_id, to_id, text) in enumerate(items) if to_id in recipients]
+    result = [None] * len(items)
+    if not accepted:
+        return result
+    rating_raises = {}  # суммарные надбавки к рейтингу отправителей: {id отправителя: надбавка}
+    for _, sender_id, _, text in accepted:
+        rating_raises[sender_id] = rating_raises.get(sender_id, 0) + count_rating_raise(text)
+    # первым делом обновляем рейтинг: это захватывает блокировку базы на запись, поэтому до конца транзакции
+    # никто другой не сможет добавить сообщения, и id новых строк можно назначить заранее
+    changes = [raise_rating(session, sender_id, rating_raise) for sender_id, rating_raise in rating_raises.items()]
+    content_id = session.query(func.coalesce(func.max(Content.id), 0)).scalar()
+    message_id = session.query(func.coalesce(func.max(Message.id), 0)).scalar()
+    created_at = datetime.now()
+    contents, messages = [], []
+    for i, sender_id, to_id, text in accepted:
+        content_id += 1
+        message_id += 1
+        contents.append({'id': content_id, 'content': text})
+        messages.append({'id': message_id, 'from_id': sender_id, 'to_id': to_id, 'content_id': content_id,
+                         'created_at': created_at})
+        result[i] = message_id
+    session.execute(Content.__table__.insert(), contents)
+    session.execute(Message.__table__.insert(), messages)
+    register_messages(session, [(msg['id'], msg['from_id'], msg['to_id'], created_at) for msg in messages])
+    session.commit()  # фиксируем всю пачку одной транзакцией
+    for msg in messages:  # оповещаем подписчиков чатов о новых сообщениях
+        hub.publish(msg['from_id'], msg['to_id'], msg['id'])
+    apply_rating_changes(session, changes)  # обновляем доску почета и кэш пользователей процесса
+    return result
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, String
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, String, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy_serializer import SerializerMixin
 
@@ -10,6 +10,11 @@ from data.db_session import SqlAlchemyBase
 class Advertisement(SqlAlchemyBase, SerializerMixin):
     """Класс модели объявления."""
     __tablename__ = 'advertisements'  # название таблицы с моделью в базе данных
+    __table_args__ = (
+        # индексы для выборки последних объявлений (всех и одного автора) без сортировки всей таблицы
+        Index('ix_advertisements_created_at_id', 'created_at', 'id'),
+        Index('ix_advertisements_author_id_created_at_id', 'author_id', 'created_at', 'id'),
+    )
     serialize_rules = ('-author.email', '-author.registration_time', '-author.interests', '-author_id',
                        '-content_id')  # правила преобразования объекта модели в json
 
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+
+from data.db_session import SqlAlchemyBase
+
+
+class CacheVersion(SqlAlchemyBase):
+    """Класс модели версии кэша. Процессы приложения сравнивают версию со своей копией кэша,
+    чтобы узнавать об изменениях, сделанных другими процессами."""
+    __tablename__ = 'cache_versions'  # название таблицы с моделью в базе данных
+
+    name = Column(String, primary_key=True)  # название кэша
+    version = Column(Integer, nullable=False, default=0)  # номер версии данных кэша
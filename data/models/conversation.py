@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy_serializer import SerializerMixin
+
+from data.db_session import SqlAlchemyBase
+
+
+class Conversation(SqlAlchemyBase, SerializerMixin):
+    """Класс модели диалога двух пользователей.
+    Пара пользователей хранится упорядоченно: first_user_id всегда меньше second_user_id."""
+    __tablename__ = 'conversations'  # название таблицы с моделью в базе данных
+    serialize_rules = ('-first_user', '-second_user', '-last_message')  # правила преобразования объекта модели в json
+    __table_args__ = (
+        UniqueConstraint('first_user_id', 'second_user_id'),
+        # индексы для выборки списка чатов пользователя, упорядоченного по времени последней активности
+        Index('ix_conversations_first_user_id_last_activity', 'first_user_id', 'last_activity'),
+        Index('ix_conversations_second_user_id_last_activity', 'second_user_id', 'last_activity'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # id диалога
+    first_user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # id пользователя с меньшим id
+    second_user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # id пользователя с большим id
+    last_message_id = Column(Integer, ForeignKey('messages.id'))  # id последнего сообщения в диалоге
+    last_activity = Column(DateTime, default=datetime.now)  # время последнего сообщения в диалоге
+    first_unread = Column(Integer, default=0, nullable=False)  # количество непрочитанных первого пользователя
+    second_unread = Column(Integer, default=0, nullable=False)  # количество непрочитанных второго пользователя
+    first_last_read_id = Column(Integer, default=0, nullable=False)  # id последнего прочитанного первым пользователем
+    second_last_read_id = Column(Integer, default=0, nullable=False)  # id последнего прочитанного вторым пользователем
+
+    first_user = relationship('User', foreign_keys=[first_user_id])  # объект первого пользователя
+    second_user = relationship('User', foreign_keys=[second_user_id])  # объект второго пользователя
+    last_message = relationship('Message')  # объект последнего сообщения в диалоге
+
+    def companion(self, user_id: int):
+        """Метод, возвращающий собеседника пользователя в диалоге.
+        :param user_id: id пользователя"""
+        return self.second_user if self.first_user_id == user_id else self.first_user
+
+    def unread_for(self, user_id: int) -> int:
+        """Метод, возвращающий количество непрочитанных пользователем сообщений в диалоге.
+        :param user_id: id пользователя"""
+        return self.first_unread if self.first_user_id == user_id else self.second_unread
+
+    def last_read_for(self, user_id: int) -> int:
+        """Метод, возвращающий id последнего прочитанного пользователем сообщения в диалоге.
+        :param user_id: id пользователя"""
+        return self.first_last_read_id if self.first_user_id == user_id else self.second_last_read_id
+
+    def __repr__(self):
+        return f'<Conversation> {self.id}: {self.first_user_id} - {self.second_user_id}'
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy_serializer import SerializerMixin
 
@@ -10,6 +10,8 @@ class Message(SqlAlchemyBase, SerializerMixin):
     """Класс модели сообщения."""
     __tablename__ = 'messages'  # название таблицы с моделью в базе данных
     serialize_rules = ('-sender', '-receiver', '-content_id')  # правила преобразования объекта модели в json
+    # составной индекс для постраничной выборки переписки между двумя пользователями
+    __table_args__ = (Index('ix_messages_from_id_to_id_id', 'from_id', 'to_id', 'id'),)
 
     id = Column(Integer, autoincrement=True, primary_key=True)  # id сообщения
     to_id = Column(Integer, ForeignKey("users.id"))  # id получателя сообщения
@@ -23,3 +25,17 @@ class Message(SqlAlchemyBase, SerializerMixin):
 
     def __repr__(self):
         return f'<Message> {self.id}: from {self.sender} to {self.receiver}: "{self.content.content}"'
+
+
+# полнотекстовый индекс FTS5 по содержанию сообщений (rowid строки индекса - id сообщения)
+# и триггеры, поддерживающие его в актуальном состоянии при добавлении и удалении сообщений
+MESSAGES_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts (rowid, content) SELECT new.id, contents.content FROM contents "
+    "WHERE contents.id = new.content_id; END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.id; END",
+)
+for statement in MESSAGES_FTS_DDL:
+    event.listen(Message.__table__, 'after_create', DDL(statement))
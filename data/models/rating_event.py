@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, UniqueConstraint
+
+from data.db_session import SqlAlchemyBase
+
+
+class RatingEvent(SqlAlchemyBase):
+    """Класс модели события изменения рейтинга. Таблица только пополняется: строки не изменяются и не удаляются."""
+    __tablename__ = 'rating_events'  # название таблицы с моделью в базе данных
+    # индекс для свертки событий по часам
+    __table_args__ = (Index('ix_rating_events_created_at', 'created_at'),)
+
+    id = Column(Integer, autoincrement=True, primary_key=True)  # id события
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # id пользователя
+    delta = Column(Float, nullable=False)  # изменение рейтинга
+    created_at = Column(DateTime, default=datetime.now, nullable=False)  # время события
+
+
+class RatingRollup(SqlAlchemyBase):
+    """Класс модели свертки событий изменения рейтинга: суммарное изменение рейтинга пользователя
+    за час или за день."""
+    __tablename__ = 'rating_rollups'  # название таблицы с моделью в базе данных
+    __table_args__ = (
+        UniqueConstraint('period', 'bucket_start', 'user_id'),
+        # индекс для выборки сверток за промежуток времени
+        Index('ix_rating_rollups_period_bucket_start', 'period', 'bucket_start'),
+    )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)  # id свертки
+    period = Column(String, nullable=False)  # длина промежутка: 'hour' или 'day'
+    bucket_start = Column(DateTime, nullable=False)  # начало промежутка
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # id пользователя
+    total = Column(Float, nullable=False)  # суммарное изменение рейтинга за промежуток
@@ -1,18 +1,26 @@
 from datetime import datetime
 from flask_login import UserMixin
-from sqlalchemy import Column, Integer, String, Unicode, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Unicode, DateTime, ForeignKey, Boolean, Index, DDL, event
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy_serializer import SerializerMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 
 from data.db_session import SqlAlchemyBase
+from data.passwords import password_hasher
+from data.user_keys import email_key, phone_key
 
 
 class User(SqlAlchemyBase, UserMixin, SerializerMixin):
     """Класс модели пользователя."""
     __tablename__ = 'users'  # название таблицы с моделью в базе данных
-    serialize_rules = (
-        '-advertisements', '-rank_id', '-admin', '-hashed_password')  # правила преобразования объекта модели в json
+    serialize_rules = ('-advertisements', '-rank_id', '-admin', '-hashed_password',
+                       '-email_key', '-phone_key')  # правила преобразования объекта модели в json
+    # составной индекс для подсчета места пользователя на доске почета (рейтинг, при равенстве - id)
+    __table_args__ = (
+        Index('ix_users_rating_id', 'rating', 'id'),
+        # уникальные индексы для проверки занятости адреса эл. почты и номера телефона
+        Index('ix_users_email_key', 'email_key', unique=True),
+        Index('ix_users_phone_key', 'phone_key', unique=True),
+    )
 
     id = Column(Integer, autoincrement=True, primary_key=True)  # id пользователя
     name = Column(Unicode)  # имя пользователя
@@ -25,21 +33,71 @@ class User(SqlAlchemyBase, UserMixin, SerializerMixin):
     rating = Column(Integer, default=0)  # рейтинг пользователя
     rank_id = Column(Integer, ForeignKey('ranks.id'))  # id ранга пользователя
     admin = Column(Boolean, default=0)  # права пользователя
+    email_key = Column(String)  # нормализованный адрес эл. почты (заполняется автоматически)
+    phone_key = Column(String)  # нормализованный номер телефона (заполняется автоматически)
 
     advertisements = relationship('Advertisement', back_populates='author')  # объекты объявлений пользователя
     interests = relationship('Interest', secondary='users_to_interests',
                              backref='users')  # объекты интересов пользователя
     rank = relationship('Rank')  # объект ранга пользователя
 
+    @validates('email')
+    def validate_email(self, key, email):
+        """Метод, обновляющий нормализованный ключ при изменении адреса эл. почты."""
+        self.email_key = email_key(email)
+        return email
+
+    @validates('phone_number')
+    def validate_phone_number(self, key, phone_number):
+        """Метод, обновляющий нормализованный ключ при изменении номера телефона."""
+        self.phone_key = phone_key(phone_number)
+        return phone_number
+
     def set_password(self, password):
         """Метод, устанавливающий пользователю пароль.
         :param password: пароль, который необходимо установить"""
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = password_hasher.hash(password)
 
     def check_password(self, password):
         """Метод, проверяющий пароль.
         :param password: пароль, который необходимо сравнить с паролем пользователя"""
-        return check_password_hash(self.hashed_password, password)
+        return password_hasher.verify(self.hashed_password, password)
+
+    def replace_password(self, password) -> bool:
+        """Метод, меняющий пароль пользователя, если новый пароль отличается от текущего.
+        Сравнение и хэширование выполняются одной операцией пула. Возвращает True, если пароль был изменен.
+        :param password: новый пароль"""
+        hashed_password = password_hasher.replace_if_different(self.hashed_password, password)
+        if hashed_password is None:
+            return False
+        self.hashed_password = hashed_password
+        return True
+
+    def rehash_password(self, password) -> bool:
+        """Метод, пересчитывающий хэш пароля, если он создан с устаревшими алгоритмом или стоимостью.
+        Вызывается после успешной проверки пароля. Возвращает True, если хэш был пересчитан.
+        :param password: проверенный пароль пользователя"""
+        if not password_hasher.needs_rehash(self.hashed_password):
+            return False
+        self.set_password(password)
+        return True
 
     def __repr__(self):
         return f'<User> {self.id}: {self.name} {self.surname}'
+
+
+# полнотекстовый индекс FTS5 по имени, фамилии и телефону пользователей (rowid строки индекса - id пользователя)
+# и триггеры, поддерживающие его в актуальном состоянии при добавлении, изменении и удалении пользователей
+USERS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts "
+    "USING fts5(name, surname, phone, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts (rowid, name, surname, phone) VALUES (new.id, new.name, new.surname, new.phone_key); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, surname, phone_key ON users BEGIN "
+    "DELETE FROM users_fts WHERE rowid = old.id; "
+    "INSERT INTO users_fts (rowid, name, surname, phone) VALUES (new.id, new.name, new.surname, new.phone_key); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+    "DELETE FROM users_fts WHERE rowid = old.id; END",
+)
+for statement in USERS_FTS_DDL:
+    event.listen(User.__table__, 'after_create', DDL(statement))
@@ -0,0 +1,39 @@
+import threading
+
+from data.conversations import ordered_pair
+
+
+class NotificationHub:
+    """Класс внутрипроцессного концентратора уведомлений о новых сообщениях.
+    Для каждого диалога хранит id последнего отправленного сообщения и будит ожидающие его клиентов.
+    Уведомления не выходят за пределы процесса: о сообщениях, отправленных через другие процессы, ожидающие
+    узнают, только заново прочитав базу по истечении времени ожидания."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._last_ids = {}  # id последних сообщений диалогов: {(id первого пользователя, id второго): id сообщения}
+
+    def publish(self, from_id: int, to_id: int, message_id: int):
+        """Метод, оповещающий подписчиков диалога о новом сообщении.
+        Вызывается после фиксации транзакции с сообщением.
+        :param from_id: id отправителя
+        :param to_id: id получателя
+        :param message_id: id нового сообщения"""
+        key = ordered_pair(from_id, to_id)
+        with self._condition:
+            self._last_ids[key] = max(self._last_ids.get(key, 0), message_id)
+            self._condition.notify_all()
+
+    def wait(self, user_id: int, companion_id: int, after_id: int, timeout: float) -> bool:
+        """Метод, ожидающий появления в диалоге сообщения новее указанного.
+        Возвращает True, если такое сообщение появилось, и False, если время ожидания истекло.
+        :param user_id: id клиента
+        :param companion_id: id собеседника
+        :param after_id: id последнего сообщения, известного клиенту
+        :param timeout: максимальное время ожидания в секундах"""
+        key = ordered_pair(user_id, companion_id)
+        with self._condition:
+            return self._condition.wait_for(lambda: self._last_ids.get(key, 0) > after_id, timeout)
+
+
+hub = NotificationHub()  # общий для всего процесса концентратор уведомлений
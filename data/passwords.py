@@ -0,0 +1,107 @@
+"""Хэширование и проверка паролей. Операции с паролями нагружают процессор и удерживают GIL, поэтому
+они выполняются в отдельном пуле процессов, а потоки обработки запросов только ждут результата."""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from data.constants import PASSWORD_HASH_METHOD, PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING, PASSWORD_TIMEOUT
+
+
+class PasswordHasherBusy(Exception):
+    """Исключение, вызываемое, когда очередь операций с паролями переполнена или операция не уложилась во время."""
+
+
+def hash_if_different(hashed_password: str, password: str, method: str):
+    """Функция, возвращающая новый хэш пароля, если пароль не совпадает с захэшированным (иначе None).
+    Выполняется в процессе пула, поэтому сравнение и хэширование занимают одну операцию.
+    :param hashed_password: текущий хэш пароля
+    :param password: новый пароль
+    :param method: алгоритм и стоимость хэширования"""
+    if hashed_password and check_password_hash(hashed_password, password):
+        return None
+    return generate_password_hash(password, method)
+
+
+class PasswordHasher:
+    """Класс пула процессов, хэширующих и проверяющих пароли, с ограниченной очередью операций."""
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING,
+                 timeout: float = PASSWORD_TIMEOUT, method: str = PASSWORD_HASH_METHOD):
+        self.workers = workers
+        self.timeout = timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending)  # свободные места в очереди операций
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _run(self, func, *args):
+        """Метод, выполняющий функцию в пуле процессов и ожидающий ее результата.
+        Если очередь переполнена или время ожидания истекло, вызывает PasswordHasherBusy.
+        :param func: функция
+        :param args: аргументы функции"""
+        if not self.workers:  # пул отключен - выполняем операцию в текущем потоке
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many pending password operations')
+        try:
+            with self._lock:
+                if self._pool is None:  # процессы пула запускаются при первой операции
+                    self._pool = ProcessPoolExecutor(self.workers)
+                future = self._pool.submit(func, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise PasswordHasherBusy('Password pool is broken')
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())  # место освобождается по завершении операции
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHasherBusy('Password operation timed out')
+        except BrokenProcessPool:
+            self._reset()
+            raise PasswordHasherBusy('Password pool is broken')
+
+    def _reset(self):
+        """Метод, сбрасывающий аварийно завершившийся пул: при следующей операции он будет создан заново."""
+        with self._lock:
+            self._pool = None
+
+    def hash(self, password: str) -> str:
+        """Метод, возвращающий хэш пароля.
+        :param password: пароль"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, hashed_password: str, password: str) -> bool:
+        """Метод, проверяющий пароль.
+        :param hashed_password: хэш пароля
+        :param password: пароль, который необходимо проверить"""
+        if not hashed_password:
+            return False
+        return self._run(check_password_hash, hashed_password, password)
+
+    def replace_if_different(self, hashed_password: str, password: str):
+        """Метод, возвращающий хэш нового пароля или None, если новый пароль совпадает с текущим.
+        :param hashed_password: текущий хэш пароля
+        :param password: новый пароль"""
+        return self._run(hash_if_different, hashed_password, password, self.method)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Метод, проверяющий, создан ли хэш пароля с устаревшими алгоритмом или стоимостью.
+        :param hashed_password: хэш пароля"""
+        return bool(hashed_password) and hashed_password.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        """Метод, останавливающий процессы пула."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+password_hasher = PasswordHasher()  # пул хэширования паролей процесса
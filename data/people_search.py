@@ -0,0 +1,54 @@
+"""Поиск пользователей по имени, фамилии и номеру телефона. Используется полнотекстовый индекс users_fts
+с префиксными индексами: имена и фамилии в нем приведены к нижнему регистру (в том числе кириллица),
+а номера телефонов хранятся только цифрами. Индекс поддерживается триггерами на таблице пользователей."""
+
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from data.__all_models import User
+from data.constants import SEARCH_PAGE_SIZE
+from data.repositories import user_options
+
+# отбираем совпадения в индексе и упорядочиваем их по релевантности (совпадение в имени или фамилии весит
+# больше совпадения в номере телефона), а при равной релевантности - по рейтингу
+SEARCH_QUERY = text("SELECT users.id FROM users_fts JOIN users ON users.id = users_fts.rowid "
+                    "WHERE users_fts MATCH :query "
+                    "ORDER BY bm25(users_fts, 10.0, 10.0, 1.0), users.rating DESC, users.id "
+                    "LIMIT :limit OFFSET :offset")
+
+
+def build_people_query(query: str) -> str:
+    """Функция, преобразующая введенный пользователем текст в запрос FTS5.
+    Запрос только из цифр и знаков номера телефона ищется по началу номера, иначе каждое слово
+    ищется по началу имени или фамилии.
+    :param query: поисковый запрос пользователя"""
+    if re.fullmatch(r'[\d\s()+-]+', query):
+        digits = re.sub(r'\D', '', query)
+        if not digits:
+            return ''
+        prefixes = [digits]
+        if digits.startswith('8'):  # 8 900 ... и +7 900 ... - один и тот же номер
+            prefixes.append('7' + digits[1:])
+        return ' OR '.join(f'phone : "{prefix}"*' for prefix in prefixes)
+    return ' '.join('{name surname} : "' + term.replace('"', '""') + '"*' for term in query.split())
+
+
+def search_users(session: Session, query: str, page: int = 1, limit: int = SEARCH_PAGE_SIZE) -> tuple:
+    """Функция, ищущая пользователей по имени, фамилии или номеру телефона.
+    Возвращает кортеж (найденные пользователи в порядке релевантности, есть ли следующая страница результатов).
+    :param session: сессия базы данных
+    :param query: поисковый запрос
+    :param page: номер страницы результатов (начиная с 1)
+    :param limit: количество результатов на странице"""
+    match = build_people_query(query)
+    if not match:
+        return [], False
+    ids = [row[0] for row in session.execute(SEARCH_QUERY, {'query': match, 'limit': limit + 1,
+                                                            'offset': (page - 1) * limit})]
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    # загружаем найденных пользователей вместе с рангами и интересами и восстанавливаем порядок релевантности
+    users = {user.id: user for user in session.query(User).options(*user_options()).filter(User.id.in_(ids))}
+    return [users[user_id] for user_id in ids], has_more
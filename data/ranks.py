@@ -0,0 +1,70 @@
+"""Таблица рангов. Строится один раз по базе данных и отвечает на вопрос "какой ранг у такого рейтинга"
+двоичным поиском по отсортированным порогам, не обращаясь к базе."""
+
+import threading
+from bisect import bisect_right
+
+from sqlalchemy.orm import Session
+
+from data.__all_models import Rank
+from data.constants import RANKS
+
+
+class RankTable:
+    """Класс таблицы соответствия порогов рейтинга id рангов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thresholds = []  # пороги рейтинга в порядке возрастания
+        self._rank_ids = []  # id рангов, соответствующих порогам
+        self._titles = {}  # названия всех рангов базы данных: {id ранга: название}
+
+    @property
+    def loaded(self) -> bool:
+        """Свойство, показывающее, построена ли таблица."""
+        return bool(self._thresholds)
+
+    def refresh(self, session: Session):
+        """Метод, заново строящий таблицу по базе данных. Недостающие ранги из RANKS добавляются в базу.
+        :param session: сессия базы данных"""
+        titles = dict(session.query(Rank.id, Rank.title))
+        rank_ids = {title: rank_id for rank_id, title in titles.items()}
+        missing = [Rank(title=title) for title in RANKS.values() if title not in rank_ids]
+        if missing:  # добавляем ранги, которых еще нет в базе данных
+            session.add_all(missing)
+            session.commit()
+            rank_ids.update((rank.title, rank.id) for rank in missing)
+            titles.update((rank.id, rank.title) for rank in missing)
+        thresholds = sorted(RANKS)
+        with self._lock:  # подменяем списки разом, чтобы читающие потоки не увидели их несогласованными
+            self._thresholds, self._rank_ids = thresholds, [rank_ids[RANKS[threshold]] for threshold in thresholds]
+            self._titles = titles
+
+    def _ensure_loaded(self, session: Session = None):
+        """Метод, строящий таблицу по переданной сессии, если она еще не построена.
+        :param session: сессия базы данных"""
+        if not self.loaded:
+            if session is None:
+                raise RuntimeError('Rank table is not loaded')
+            self.refresh(session)
+
+    def get_rank_id(self, rating: float, session: Session = None):
+        """Метод, возвращающий id ранга, соответствующего рейтингу (None, если рейтинг ниже всех порогов).
+        Если таблица еще не построена, она строится по переданной сессии.
+        :param rating: рейтинг пользователя
+        :param session: сессия базы данных"""
+        self._ensure_loaded(session)
+        thresholds, rank_ids = self._thresholds, self._rank_ids
+        i = bisect_right(thresholds, rating or 0)
+        return rank_ids[i - 1] if i else None
+
+    def get_rank_title(self, rank_id: int, session: Session = None):
+        """Метод, возвращающий название ранга по его id (None, если такого ранга нет).
+        Если таблица еще не построена, она строится по переданной сессии.
+        :param rank_id: id ранга
+        :param session: сессия базы данных"""
+        self._ensure_loaded(session)
+        return self._titles.get(rank_id)
+
+
+rank_table = RankTable()  # таблица рангов процесса
@@ -0,0 +1,100 @@
+"""Пересчет рейтинга и рангов всех пользователей по истории сообщений. Длины сообщений читаются порциями,
+а надбавки к рейтингу считаются сразу для всей порции векторными операциями NumPy."""
+
+import numpy as np
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from data.__all_models import User, Content, Message
+from data.archive import ArchiveSegment, create_archive_session
+from data.constants import RATE, RECOMPUTE_CHUNK_SIZE
+from data.leaderboard import top_cache
+from data.ranks import rank_table
+
+
+def rating_raises(lengths: np.ndarray) -> np.ndarray:
+    """Функция, рассчитывающая надбавки к рейтингу за сообщения указанных длин.
+    Векторный аналог count_rating_raise: жадный размен длины на пороги RATE от большего к меньшему
+    сводится к целочисленному делению и остатку для каждого порога.
+    :param lengths: массив длин сообщений"""
+    remainder = lengths.astype(np.int64)
+    raises = np.zeros(len(remainder), dtype=np.float64)
+    for threshold in sorted(RATE, reverse=True):
+        if threshold != 1:
+            raises += (remainder // threshold) * RATE[threshold]
+            remainder %= threshold
+    return raises + (remainder % 10) / 10
+
+
+def accumulate(totals: dict, sender_ids: np.ndarray, lengths: np.ndarray):
+    """Функция, добавляющая надбавки за порцию сообщений к суммарным рейтингам отправителей.
+    :param totals: суммарные рейтинги: {id отправителя: рейтинг}
+    :param sender_ids: массив id отправителей сообщений порции
+    :param lengths: массив длин сообщений порции"""
+    senders, positions = np.unique(sender_ids, return_inverse=True)
+    for sender_id, total in zip(senders.tolist(), np.bincount(positions, weights=rating_raises(lengths)).tolist()):
+        totals[sender_id] = totals.get(sender_id, 0) + total
+
+
+def stream_message_lengths(session: Session, chunk_size: int):
+    """Генератор, выдающий порции (массив id отправителей, массив длин сообщений) из основной базы данных.
+    Порции выбираются по курсору id сообщения, поэтому каждая - ограниченный проход по первичному ключу.
+    :param session: сессия базы данных
+    :param chunk_size: количество сообщений в порции"""
+    last_id = 0
+    while True:
+        rows = session.query(Message.id, Message.from_id, func.coalesce(func.length(Content.content), 0)) \
+            .outerjoin(Content, Content.id == Message.content_id) \
+            .filter(Message.id > last_id).order_by(Message.id).limit(chunk_size).all()
+        if not rows:
+            return
+        ids, sender_ids, lengths = np.array(rows, dtype=np.int64).T
+        last_id = int(ids[-1])
+        yield sender_ids, lengths
+
+
+def stream_archived_lengths():
+    """Генератор, выдающий порции (массив id отправителей, массив длин сообщений) из архива - по сегменту за раз.
+    Если архив не подключен, ничего не выдает."""
+    archive_session = create_archive_session()
+    if archive_session is None:
+        return
+    for segment in archive_session.query(ArchiveSegment).yield_per(100):
+        rows = segment.unpack()
+        yield np.array([row[1] for row in rows], dtype=np.int64), \
+            np.array([len(row[4] or '') for row in rows], dtype=np.int64)
+    archive_session.close()
+
+
+def recompute_ratings(session: Session, chunk_size: int = RECOMPUTE_CHUNK_SIZE, dry_run: bool = False,
+                      progress=None) -> list:
+    """Функция, пересчитывающая рейтинг и ранг всех пользователей по их сообщениям (включая архивные).
+    Изменившиеся рейтинги и ранги записываются одним пакетным UPDATE. Возвращает список изменений
+    в виде кортежей (id пользователя, старый рейтинг, новый рейтинг, старый id ранга, новый id ранга).
+    :param session: сессия базы данных
+    :param chunk_size: количество сообщений, читаемых за раз
+    :param dry_run: только рассчитать изменения, ничего не записывая
+    :param progress: функция, вызываемая после каждой порции с количеством уже обработанных сообщений"""
+    totals = {}
+    processed = 0
+    for chunks in (stream_archived_lengths(), stream_message_lengths(session, chunk_size)):
+        for sender_ids, lengths in chunks:
+            accumulate(totals, sender_ids, lengths)
+            processed += len(lengths)
+            if progress:
+                progress(processed)
+    changes = []
+    for user_id, rating, rank_id in session.query(User.id, User.rating, User.rank_id).order_by(User.id):
+        new_rating = round(totals.get(user_id, 0), 1)
+        new_rank_id = rank_table.get_rank_id(new_rating, session)
+        if new_rating != rating or new_rank_id != rank_id:
+            changes.append((user_id, rating, new_rating, rank_id, new_rank_id))
+    if changes and not dry_run:
+        users = User.__table__
+        session.execute(users.update().where(users.c.id == bindparam('b_id'))
+                        .values(rating=bindparam('b_rating'), rank_id=bindparam('b_rank_id')),
+                        [{'b_id': user_id, 'b_rating': new_rating, 'b_rank_id': new_rank_id}
+                         for user_id, _, new_rating, _, new_rank_id in changes])
+        top_cache.invalidate(session)  # рейтинги могли уменьшиться - доска почета строится заново
+        session.commit()
+    return changes
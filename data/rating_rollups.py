@@ -0,0 +1,134 @@
+"""Журнал изменений рейтинга и его свертки. Каждое изменение рейтинга записывается событием, события
+завершившихся часов периодически сворачиваются в почасовые суммы, а почасовые суммы завершившихся дней -
+в посуточные. Доска почета за день, неделю или месяц складывается из посуточных и почасовых сумм
+и лишь небольшого хвоста еще не свернутых событий."""
+
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from data.__all_models import RatingEvent
+from data.constants import TOP_SIZE, RATING_ROLLUP_INTERVAL
+from data.db_session import create_session
+from data.leaderboard import TopEntry
+from data.ranks import rank_table
+
+# формат, в котором SQLAlchemy хранит время в SQLite (строки такого вида сравниваются в хронологическом порядке)
+HOUR_FORMAT = '%Y-%m-%d %H:00:00.000000'
+DAY_FORMAT = '%Y-%m-%d 00:00:00.000000'
+ROLLUP_GRACE = 60  # время (в секундах) после окончания часа, в течение которого его события еще не сворачиваются
+
+# события завершившихся часов, еще не свернутые в почасовые суммы, сворачиваются одним INSERT
+ROLLUP_HOURS = text(f"""
+INSERT INTO rating_rollups (period, bucket_start, user_id, total)
+SELECT 'hour', strftime('{HOUR_FORMAT}', created_at), user_id, sum(delta) FROM rating_events
+WHERE created_at >= coalesce((SELECT strftime('{HOUR_FORMAT}', max(bucket_start), '+1 hour') FROM rating_rollups
+                              WHERE period = 'hour'), '')
+AND created_at < :before
+GROUP BY strftime('{HOUR_FORMAT}', created_at), user_id
+""")
+
+# почасовые суммы завершившихся дней, еще не свернутые в посуточные, сворачиваются одним INSERT
+ROLLUP_DAYS = text(f"""
+INSERT INTO rating_rollups (period, bucket_start, user_id, total)
+SELECT 'day', strftime('{DAY_FORMAT}', bucket_start), user_id, sum(total) FROM rating_rollups
+WHERE period = 'hour'
+AND bucket_start >= coalesce((SELECT strftime('{DAY_FORMAT}', max(bucket_start), '+1 day') FROM rating_rollups
+                              WHERE period = 'day'), '')
+AND bucket_start < :before
+GROUP BY strftime('{DAY_FORMAT}', bucket_start), user_id
+""")
+
+# доска почета за промежуток: посуточные суммы, затем почасовые суммы после последнего свернутого дня
+# и события после последнего свернутого часа
+WINDOW_TOP = text(f"""
+WITH marks AS (
+    SELECT max(:since, coalesce((SELECT strftime('{DAY_FORMAT}', max(bucket_start), '+1 day') FROM rating_rollups
+                                 WHERE period = 'day'), '')) AS after_days,
+           max(:since, coalesce((SELECT strftime('{HOUR_FORMAT}', max(bucket_start), '+1 hour') FROM rating_rollups
+                                 WHERE period = 'hour'), ''),
+                       coalesce((SELECT strftime('{DAY_FORMAT}', max(bucket_start), '+1 day') FROM rating_rollups
+                                 WHERE period = 'day'), '')) AS after_hours
+), totals AS (
+    SELECT user_id, total FROM rating_rollups WHERE period = 'day' AND bucket_start >= :since
+    UNION ALL
+    SELECT user_id, total FROM rating_rollups, marks WHERE period = 'hour' AND bucket_start >= marks.after_days
+    UNION ALL
+    SELECT user_id, delta FROM rating_events, marks WHERE created_at >= marks.after_hours
+)
+SELECT users.id, users.name, users.surname, round(sum(totals.total), 1) AS rating, users.rank_id
+FROM totals JOIN users ON users.id = totals.user_id
+GROUP BY users.id HAVING sum(totals.total) > 0
+ORDER BY rating DESC, users.id LIMIT :limit
+""")
+
+
+def log_rating_change(session: Session, user_id: int, delta: float):
+    """Функция, записывающая событие изменения рейтинга. Изменения не фиксируются.
+    :param session: сессия базы данных
+    :param user_id: id пользователя
+    :param delta: изменение рейтинга"""
+    session.execute(RatingEvent.__table__.insert().values(user_id=user_id, delta=delta, created_at=datetime.now()))
+
+
+def rollup_ratings(session: Session, now: datetime = None):
+    """Функция, сворачивающая события завершившихся часов в почасовые суммы, а почасовые суммы
+    завершившихся дней - в посуточные. Каждая свертка - один INSERT, опирающийся на уже сделанные свертки,
+    поэтому ее можно безопасно запускать повторно и из нескольких процессов.
+    :param session: сессия базы данных
+    :param now: текущее время"""
+    # час считается завершившимся с запасом, чтобы успели зафиксироваться транзакции, начатые в его конце
+    now = (now or datetime.now()) - timedelta(seconds=ROLLUP_GRACE)
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    session.execute(ROLLUP_HOURS, {'before': hour_start.strftime(HOUR_FORMAT)})
+    session.execute(ROLLUP_DAYS, {'before': hour_start.replace(hour=0).strftime(DAY_FORMAT)})
+    session.commit()
+
+
+def window_start(window: str, now: datetime = None) -> datetime:
+    """Функция, возвращающая начало календарного промежутка, содержащего текущий момент.
+    :param window: промежуток: 'day', 'week' или 'month'
+    :param now: текущее время"""
+    day_start = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'day':
+        return day_start
+    if window == 'week':
+        return day_start - timedelta(days=day_start.weekday())
+    if window == 'month':
+        return day_start.replace(day=1)
+    raise ValueError(f'Unknown window: {window}')
+
+
+def get_window_top(session: Session, window: str, limit: int = TOP_SIZE, now: datetime = None) -> list:
+    """Функция, возвращающая доску почета за текущий день, неделю или месяц.
+    Рейтинг в строках доски - прирост рейтинга пользователя за промежуток.
+    :param session: сессия базы данных
+    :param window: промежуток: 'day', 'week' или 'month'
+    :param limit: количество пользователей на доске
+    :param now: текущее время"""
+    since = window_start(window, now).strftime(DAY_FORMAT)
+    rows = session.execute(WINDOW_TOP, {'since': since, 'limit': limit}).fetchall()
+    return [TopEntry(user_id, name, surname, rating, rank_table.get_rank_title(rank_id, session))
+            for user_id, name, surname, rating, rank_id in rows]
+
+
+def schedule_rollups(interval: float = RATING_ROLLUP_INTERVAL):
+    """Функция, запускающая фоновый поток, который периодически сворачивает события изменения рейтинга.
+    :param interval: интервал между свертками в секундах"""
+
+    def run():
+        while not stop.is_set():
+            session = create_session()
+            try:
+                rollup_ratings(session)
+            except Exception:  # неудавшаяся свертка будет повторена в следующий раз
+                session.rollback()
+            finally:
+                session.close()
+            stop.wait(interval)
+
+    stop = threading.Event()
+    threading.Thread(target=run, name='rating-rollups', daemon=True).start()
+    return stop
@@ -0,0 +1,75 @@
+"""Запросы к моделям, заранее подгружающие все связанные объекты, которые используют шаблоны и API.
+Так количество запросов к базе на страницу не зависит от количества выводимых строк."""
+
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from data.__all_models import User, Advertisement
+from data.user_keys import email_key, phone_key
+
+
+def user_options():
+    """Функция, возвращающая параметры подгрузки связанных объектов пользователя (ранг и интересы)."""
+    return joinedload(User.rank), selectinload(User.interests)
+
+
+def ad_options():
+    """Функция, возвращающая параметры подгрузки связанных объектов объявления (автор, содержание и тэги)."""
+    return joinedload(Advertisement.author).joinedload(User.rank), joinedload(Advertisement.content), \
+        selectinload(Advertisement.interests)
+
+
+def get_user_details(session: Session, user_id: int):
+    """Функция, получающая пользователя вместе с его рангом и интересами.
+    :param session: сессия базы данных
+    :param user_id: id пользователя"""
+    return session.query(User).options(*user_options()).filter(User.id == user_id).first()
+
+
+def get_profile(session: Session, user_id: int):
+    """Функция, получающая пользователя вместе со всем, что выводится на странице его профиля.
+    :param session: сессия базы данных
+    :param user_id: id пользователя"""
+    return session.query(User).options(*user_options(),
+                                       selectinload(User.advertisements).joinedload(Advertisement.content)) \
+        .filter(User.id == user_id).first()
+
+
+def get_latest_ads(session: Session, limit: int, author_id: int = None) -> list:
+    """Функция, получающая последние объявления вместе с их авторами, содержанием и тэгами.
+    :param session: сессия базы данных
+    :param limit: количество объявлений
+    :param author_id: id автора, если нужны объявления только одного пользователя"""
+    query = session.query(Advertisement).options(*ad_options())
+    if author_id is not None:
+        query = query.filter(Advertisement.author_id == author_id)
+    return query.order_by(Advertisement.created_at.desc(), Advertisement.id.desc()).limit(limit).all()
+
+
+def email_taken(session: Session, email: str, exclude_id: int = None) -> bool:
+    """Функция, проверяющая одним поиском по индексу, занят ли адрес эл. почты другим пользователем.
+    :param session: сессия базы данных
+    :param email: адрес эл. почты
+    :param exclude_id: id пользователя, которого не нужно учитывать (например, самого редактирующего)"""
+    return key_taken(session, User.email_key, email_key(email), exclude_id)
+
+
+def phone_taken(session: Session, phone_number: str, exclude_id: int = None) -> bool:
+    """Функция, проверяющая одним поиском по индексу, занят ли номер телефона другим пользователем.
+    :param session: сессия базы данных
+    :param phone_number: номер телефона
+    :param exclude_id: id пользователя, которого не нужно учитывать (например, самого редактирующего)"""
+    return key_taken(session, User.phone_key, phone_key(phone_number), exclude_id)
+
+
+def key_taken(session: Session, column, key: str, exclude_id: int = None) -> bool:
+    """Функция, проверяющая наличие пользователя с указанным нормализованным ключом контакта.
+    :param session: сессия базы данных
+    :param column: столбец ключа
+    :param key: нормализованный ключ
+    :param exclude_id: id пользователя, которого не нужно учитывать"""
+    if key is None:
+        return False
+    query = session.query(User.id).filter(column == key)
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    return session.query(query.exists()).scalar()
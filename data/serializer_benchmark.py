@@ -0,0 +1,47 @@
+"""Сравнение скорости скомпилированных сериализаторов и to_dict() SerializerMixin на данных базы.
+Перед замером проверяется, что результаты обоих способов совпадают побайтно."""
+
+import timeit
+
+from sqlalchemy.orm import Session, joinedload
+
+from data.__all_models import User, Message, Advertisement, Interest, Content
+from data.repositories import user_options, ad_options
+from data.serializers import JSON_ENCODER, serializer
+
+
+def benchmark_cases(session: Session, limit: int) -> list:
+    """Функция, загружающая объекты для замеров.
+    Возвращает список кортежей (название, объекты, дополнительные правила).
+    :param session: сессия базы данных
+    :param limit: максимальное количество объектов каждой модели"""
+    users = session.query(User).options(*user_options()).limit(limit).all()
+    return [
+        ('User', users, ()),
+        ('User без email', users, ('-email',)),
+        ('Message', session.query(Message).options(joinedload(Message.content)).limit(limit).all(), ()),
+        ('Advertisement', session.query(Advertisement).options(*ad_options()).limit(limit).all(), ()),
+        ('Interest', session.query(Interest).limit(limit).all(), ()),
+        ('Content', session.query(Content).limit(limit).all(), ()),
+    ]
+
+
+def benchmark_serializers(session: Session, limit: int = 1000, repeat: int = 5) -> list:
+    """Функция, замеряющая время сериализации одного объекта каждой модели обоими способами.
+    Возвращает список кортежей (название, количество объектов, мкс на объект для to_dict, мкс на объект
+    для скомпилированного сериализатора). Если результаты различаются, вызывает AssertionError.
+    :param session: сессия базы данных
+    :param limit: максимальное количество объектов каждой модели
+    :param repeat: количество повторов замера (берется лучший)"""
+    results = []
+    for name, objects, rules in benchmark_cases(session, limit):
+        if not objects:
+            continue
+        compiled = serializer(type(objects[0]), rules)
+        for obj in objects:  # результаты должны совпадать побайтно
+            assert JSON_ENCODER.encode(compiled(obj)) == JSON_ENCODER.encode(obj.to_dict(rules=rules)), \
+                f'{name} {obj.id}: compiled serializer differs from to_dict()'
+        slow = min(timeit.repeat(lambda: [obj.to_dict(rules=rules) for obj in objects], number=1, repeat=repeat))
+        fast = min(timeit.repeat(lambda: [compiled(obj) for obj in objects], number=1, repeat=repeat))
+        results.append((name, len(objects), slow / len(objects) * 1e6, fast / len(objects) * 1e6))
+    return results
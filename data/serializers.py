@@ -0,0 +1,144 @@
+"""Скомпилированные сериализаторы моделей для ответов API. Для модели и набора правил (в формате serialize_rules
+SerializerMixin) один раз строится план - плоский список полей с функциями чтения и преобразования значений,
+поэтому преобразование объекта в json не разбирает правила и не исследует атрибуты модели заново.
+Результат совпадает с to_dict() SerializerMixin."""
+
+import json
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from operator import attrgetter
+
+from flask import current_app, jsonify
+from sqlalchemy import inspect
+from sqlalchemy.orm import RelationshipProperty, configure_mappers
+from sqlalchemy_serializer import SerializerMixin
+
+SIMPLE_TYPES = (int, str, float, bool, type(None))  # типы, значения которых попадают в json как есть
+
+# кодировщик json с теми же настройками, что и jsonify (ascii, сортировка ключей, компактные разделители)
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+_compiled = {}  # скомпилированные сериализаторы: {(модель, правила, поля): сериализатор}
+_lock = threading.Lock()
+
+
+def convert_value(value):
+    """Функция, преобразующая значение столбца так же, как SerializerMixin.
+    :param value: значение столбца"""
+    if isinstance(value, SIMPLE_TYPES):
+        return value
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, time):
+        return value.strftime(SerializerMixin.time_format)
+    if isinstance(value, datetime):
+        return value.strftime(SerializerMixin.datetime_format)
+    if isinstance(value, date):
+        return value.strftime(SerializerMixin.date_format)
+    if isinstance(value, Decimal):
+        return SerializerMixin.decimal_format.format(value)
+    raise TypeError(f'Unserializable type: {type(value)}')
+
+
+class CompiledSerializer:
+    """Класс скомпилированного сериализатора модели. План строится при первом использовании,
+    когда все связи моделей уже настроены."""
+
+    def __init__(self, model, rules: tuple = (), only: tuple = None):
+        self.model = model
+        self.rules = tuple(getattr(model, 'serialize_rules', ())) + tuple(rules)
+        self.only = None if only is None else tuple(only)
+        self._plan = None
+        self._keys = None
+
+    def compile(self) -> list:
+        """Метод, строящий план сериализации: список кортежей (ключ, функция чтения, функция преобразования).
+        Поддерживаются исключающие правила ('-поле' и '-связь.поле'), которые используют модели приложения."""
+        configure_mappers()
+        excluded, nested = set(), {}
+        for rule in self.rules:
+            if not rule.startswith('-'):
+                raise ValueError(f'Unsupported serialization rule: {rule}')
+            key, _, rest = rule[1:].partition('.')
+            if rest:  # правило для связанной модели передается ее сериализатору
+                nested.setdefault(key, []).append('-' + rest)
+            else:
+                excluded.add(key)
+        plan = []
+        for attr in inspect(self.model).attrs:
+            if attr.key in excluded or self.only is not None and attr.key not in self.only:
+                continue
+            if isinstance(attr, RelationshipProperty):
+                child = CompiledSerializer(attr.mapper.class_, tuple(nested.get(attr.key, ())))
+                plan.append((attr.key, attrgetter(attr.key), child.many if attr.uselist else child.one))
+            else:
+                plan.append((attr.key, attrgetter(attr.key), convert_value))
+        return plan
+
+    @property
+    def plan(self) -> list:
+        """План сериализации (строится при первом обращении)."""
+        if self._plan is None:
+            plan = self.compile()
+            self._keys = tuple(key for key, _, _ in plan)
+            self._plan = plan
+        return self._plan
+
+    @property
+    def keys(self) -> tuple:
+        """Ключи, которые попадают в результат сериализации."""
+        if self._plan is None:
+            self.plan
+        return self._keys
+
+    def __call__(self, obj) -> dict:
+        """Метод, преобразующий объект модели в словарь.
+        :param obj: объект модели"""
+        return {key: convert(getter(obj)) for key, getter, convert in self.plan}
+
+    def one(self, obj):
+        """Метод, преобразующий связанный объект (None остается None).
+        :param obj: объект модели или None"""
+        return None if obj is None else self(obj)
+
+    def many(self, objects) -> list:
+        """Метод, преобразующий коллекцию связанных объектов.
+        :param objects: коллекция объектов модели"""
+        return [self(obj) for obj in objects]
+
+    def from_row(self, row, offset: int = 0) -> dict:
+        """Метод, преобразующий строку запроса по столбцам модели (см. columns) в словарь.
+        Подходит только для планов без связей.
+        :param row: строка результата запроса
+        :param offset: позиция первого столбца модели в строке"""
+        return {key: convert_value(row[offset + position]) for position, key in enumerate(self.keys)}
+
+    def columns(self) -> list:
+        """Метод, возвращающий столбцы модели в порядке плана - для запросов, читающих только нужные столбцы."""
+        return [getattr(self.model, key) for key in self.keys]
+
+
+def serializer(model, rules: tuple = (), only: tuple = None) -> CompiledSerializer:
+    """Функция, возвращающая скомпилированный сериализатор модели для указанных правил и полей.
+    Сериализаторы кэшируются, поэтому план для каждого сочетания строится один раз.
+    :param model: класс модели
+    :param rules: дополнительные правила в формате serialize_rules
+    :param only: сериализуемые поля (по умолчанию - все, кроме исключенных правилами)"""
+    key = (model, tuple(rules), None if only is None else tuple(only))
+    with _lock:
+        if key not in _compiled:
+            _compiled[key] = CompiledSerializer(model, rules, only)
+        return _compiled[key]
+
+
+def json_response(data):
+    """Функция, возвращающая json-ответ, побайтно совпадающий с ответом jsonify.
+    Данные кодируются заранее созданным кодировщиком; при нестандартных настройках json приложения
+    используется jsonify.
+    :param data: данные ответа (словари и списки из простых значений)"""
+    config = current_app.config
+    if config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug or not config['JSON_AS_ASCII'] or \
+            not config['JSON_SORT_KEYS']:
+        return jsonify(data)
+    return current_app.response_class(JSON_ENCODER.encode(data) + '\n', mimetype=config['JSONIFY_MIMETYPE'])
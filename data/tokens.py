@@ -0,0 +1,68 @@
+"""Токены API. Токен доступа передается с каждым запросом, а долгоживущий токен обновления позволяет получить
+новый токен доступа без повторного ввода (и дорогой проверки) пароля. Проверенные токены запоминаются,
+поэтому подпись каждого токена проверяется только один раз."""
+
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+from data.constants import SECRET_KEY, ACCESS_TOKEN_LIFETIME, REFRESH_TOKEN_LIFETIME, TOKEN_CACHE_SIZE
+
+ACCESS = 'access'  # тип токена доступа
+REFRESH = 'refresh'  # тип токена обновления
+
+
+class TokenCache:
+    """Класс кэша проверенных токенов: хранит содержимое токена по его хэшу до истечения срока действия токена."""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()  # {хэш токена: содержимое токена}
+
+    def decode(self, token: str) -> dict:
+        """Метод, возвращающий содержимое токена. Подпись проверяется только при первом обращении к токену.
+        Если токен недействителен или просрочен, вызывает исключения jwt.
+        :param token: токен"""
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        with self._lock:
+            payload = self._tokens.get(key)
+            if payload is not None:
+                if payload['exp'] > time.time():
+                    self._tokens.move_to_end(key)  # отмечаем токен как недавно использованный
+                    return payload
+                del self._tokens[key]
+                raise jwt.exceptions.ExpiredSignatureError('Signature has expired')
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])  # проверяет подпись и срок действия
+        if not isinstance(payload.get('exp'), (int, float)):  # токены без срока действия не запоминаем
+            return payload
+        with self._lock:
+            self._tokens[key] = payload
+            while len(self._tokens) > self.max_size:  # вытесняем давно не использованные токены
+                self._tokens.popitem(last=False)
+        return payload
+
+
+def password_marker(hashed_password: str) -> str:
+    """Функция, возвращающая отметку пароля для токена обновления: при смене пароля отметка меняется,
+    и выданные ранее токены обновления перестают действовать.
+    :param hashed_password: хэш пароля пользователя"""
+    return hashlib.sha256((hashed_password or '').encode('utf-8')).hexdigest()[:16]
+
+
+def issue_tokens(user) -> dict:
+    """Функция, выдающая пользователю токен доступа и токен обновления.
+    :param user: пользователь"""
+    now = datetime.datetime.utcnow()
+    access = jwt.encode({'id': user.id, 'type': ACCESS,
+                         'exp': now + datetime.timedelta(seconds=ACCESS_TOKEN_LIFETIME)}, SECRET_KEY)
+    refresh = jwt.encode({'id': user.id, 'type': REFRESH, 'pwd': password_marker(user.hashed_password),
+                          'exp': now + datetime.timedelta(seconds=REFRESH_TOKEN_LIFETIME)}, SECRET_KEY)
+    return {'token': access.decode('UTF-8'), 'refresh_token': refresh.decode('UTF-8')}
+
+
+token_cache = TokenCache()  # кэш проверенных токенов процесса
@@ -0,0 +1,137 @@
+"""Подсказки при вводе имени, фамилии или номера телефона в поиске пользователей. Каждый процесс хранит
+отсортированный массив ключей (приведенные к нижнему регистру имена и фамилии, номера телефонов цифрами)
+с id пользователей, поэтому подсказки по началу ключа ищутся двоичным поиском без обращения к базе."""
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy.orm import Session
+
+from data.__all_models import User
+from data.constants import TYPEAHEAD_LIMIT, TYPEAHEAD_SYNC_INTERVAL
+from data.db_session import create_session
+from data.leaderboard import bump_version, get_version
+from data.user_keys import phone_key
+
+TYPEAHEAD_CACHE = 'typeahead'  # название кэша подсказок в таблице версий кэшей
+
+
+def user_keys(name: str, surname: str, phone: str) -> set:
+    """Функция, возвращающая ключи подсказок пользователя.
+    :param name: имя пользователя
+    :param surname: фамилия пользователя
+    :param phone: нормализованный номер телефона пользователя"""
+    name, surname = (name or '').strip().casefold(), (surname or '').strip().casefold()
+    keys = {name, surname, f'{name} {surname}', f'{surname} {name}', phone or ''}
+    keys.discard('')
+    return keys
+
+
+def query_prefixes(query: str) -> list:
+    """Функция, приводящая введенный текст к префиксам ключей подсказок.
+    :param query: введенный пользователем текст"""
+    if re.fullmatch(r'[\d\s()+-]+', query):  # вводится номер телефона - сравниваем только цифры
+        digits = re.sub(r'\D', '', query)
+        if digits.startswith('8'):  # 8 900 ... и +7 900 ... - один и тот же номер
+            return [digits, '7' + digits[1:]]
+        return [digits] if digits else []
+    query = ' '.join(query.casefold().split())
+    return [query] if query else []
+
+
+class Typeahead:
+    """Класс индекса подсказок. Как и кэш доски почета, копия процесса сверяет свою версию с таблицей
+    версий кэшей: изменения этого процесса применяются к копии на месте, а чужие изменения обнаруживаются
+    проверкой версии не чаще раза в sync_interval секунд и приводят к перестроению копии."""
+
+    def __init__(self, sync_interval: float = TYPEAHEAD_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._keys = []  # отсортированный массив пар (ключ, id пользователя)
+        self._users = {}  # данные пользователей: {id: (имя, фамилия, ключи)}
+        self._version = None  # версия, которой соответствует копия (None - копия не построена)
+        self._checked_at = 0  # время последней сверки версии
+
+    def build(self, session: Session):
+        """Метод, заново строящий индекс по таблице пользователей.
+        :param session: сессия базы данных"""
+        version = get_version(session, TYPEAHEAD_CACHE)
+        users, keys = {}, []
+        for user_id, name, surname, phone in session.query(User.id, User.name, User.surname, User.phone_key):
+            users[user_id] = (name, surname, user_keys(name, surname, phone))
+            keys.extend((key, user_id) for key in users[user_id][2])
+        keys.sort()
+        with self._lock:
+            self._keys, self._users, self._version = keys, users, version
+            self._checked_at = time.monotonic()
+
+    def _sync(self, session: Session = None):
+        """Метод, перестраивающий индекс, если он не построен или устарел. Версия сверяется с базой
+        не чаще раза в sync_interval секунд.
+        :param session: сессия базы данных (по умолчанию создается отдельная сессия)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.sync_interval:
+                return
+            self._checked_at = now
+        own_session = session is None
+        session = session or create_session()
+        if self._version is None or get_version(session, TYPEAHEAD_CACHE) != self._version:
+            self.build(session)
+        if own_session:
+            session.close()
+
+    def complete(self, query: str, limit: int = TYPEAHEAD_LIMIT, session: Session = None) -> list:
+        """Метод, возвращающий до limit пользователей, ключ которых начинается с введенного текста,
+        в виде списка кортежей (id, имя, фамилия) в порядке ключей.
+        :param query: введенный пользователем текст
+        :param limit: максимальное количество подсказок
+        :param session: сессия базы данных (нужна, только если индекс необходимо перестроить)"""
+        self._sync(session)
+        found = []
+        with self._lock:
+            for prefix in query_prefixes(query):
+                position = bisect_left(self._keys, (prefix,))
+                while position < len(self._keys) and len(found) < limit:
+                    key, user_id = self._keys[position]
+                    if not key.startswith(prefix):
+                        break
+                    if user_id not in found:
+                        found.append(user_id)
+                    position += 1
+            return [(user_id, *self._users[user_id][:2]) for user_id in found]
+
+    def touch(self, session: Session) -> int:
+        """Метод, отмечающий изменение имени, фамилии или номера телефона пользователя в текущей транзакции.
+        Возвращает новую версию индекса, которую нужно передать в apply после фиксации.
+        :param session: сессия базы данных"""
+        return bump_version(session, TYPEAHEAD_CACHE)
+
+    def apply(self, user: User, version: int):
+        """Метод, применяющий к копии процесса изменение пользователя, зафиксированное с указанной версией.
+        Если копия успела отстать (изменения других процессов), она будет перестроена при следующем запросе.
+        :param user: добавленный или измененный пользователь
+        :param version: версия индекса, полученная при изменении"""
+        keys = user_keys(user.name, user.surname, phone_key(user.phone_number))
+        with self._lock:
+            if self._version is None or self._version != version - 1:
+                self._version = None  # копия отстала - перестраиваем ее при следующем запросе
+                return
+            if user.id in self._users:  # убираем старые ключи пользователя
+                for key in self._users[user.id][2]:
+                    del self._keys[bisect_left(self._keys, (key, user.id))]
+            for key in keys:
+                insort(self._keys, (key, user.id))
+            self._users[user.id] = (user.name, user.surname, keys)
+            self._version = version
+
+    def invalidate(self, session: Session):
+        """Метод, отмечающий индекс устаревшим во всех процессах (например, после импорта пользователей).
+        Изменения не фиксируются.
+        :param session: сессия базы данных"""
+        bump_version(session, TYPEAHEAD_CACHE)
+
+
+typeahead = Typeahead()  # индекс подсказок процесса
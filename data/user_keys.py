@@ -0,0 +1,21 @@
+"""Нормализованные ключи контактов пользователя. Адрес эл. почты сравнивается без учета регистра и пробелов
+по краям, а номер телефона - только по цифрам (российский префикс 8 приравнивается к +7). Ключи хранятся
+в отдельных индексированных столбцах (заполняются моделью пользователя), поэтому проверка занятости
+контакта - один поиск по индексу."""
+
+import re
+
+
+def email_key(email: str):
+    """Функция, возвращающая нормализованный ключ адреса эл. почты.
+    :param email: адрес эл. почты"""
+    return email.strip().casefold() if email else None
+
+
+def phone_key(phone_number: str):
+    """Функция, возвращающая нормализованный ключ номера телефона (только цифры).
+    :param phone_number: номер телефона"""
+    digits = re.sub(r'\D', '', phone_number or '')
+    if len(digits) == 11 and digits.startswith('8'):  # 8 900 ... и +7 900 ... - один и тот же номер
+        digits = '7' + digits[1:]
+    return digits or None
@@ -0,0 +1,111 @@
+"""Постраничная и потоковая выдача списка пользователей в API. Страницы выбираются по курсору id пользователя,
+запросы читают только столбцы выбранных полей, а в потоковом режиме строки читаются курсором базы данных
+порциями, поэтому расход памяти и время до первого байта ответа не зависят от количества пользователей."""
+
+from itertools import islice
+
+from sqlalchemy.orm import Session
+
+from data.__all_models import User, Interest, Rank
+from data.constants import USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE, USERS_STREAM_CHUNK_SIZE
+from data.models.interests import user_table
+from data.serializers import serializer
+
+USER_FIELDS = ('id', 'name', 'surname', 'birthday', 'email', 'phone_number', 'registration_time', 'rating', 'rank',
+               'interests')  # поля пользователя в ответах API
+
+
+def parse_listing_args(args) -> tuple:
+    """Функция, получающая параметры выдачи пользователей из параметров запроса.
+    Возвращает кортеж (id, после которого начинается выдача, количество пользователей, выбранные поля),
+    при некорректных параметрах вызывает ValueError.
+    :param args: параметры запроса"""
+    after_id = int(args.get('after_id') or 0)
+    limit = int(args.get('limit') or USERS_PAGE_SIZE)
+    if after_id < 0 or limit < 1:
+        raise ValueError('after_id must be non-negative and limit must be positive')
+    fields = tuple(field.strip() for field in args.get('fields', '').split(',') if field.strip()) or USER_FIELDS
+    if any(field not in USER_FIELDS for field in fields):
+        raise ValueError('unknown field')
+    return after_id, min(limit, USERS_MAX_PAGE_SIZE), fields
+
+
+def users_query(session: Session, after_id: int, fields: tuple):
+    """Функция, возвращающая запрос, читающий только столбцы выбранных полей пользователей с id больше after_id
+    (и столбцы ранга, если он выбран), в порядке возрастания id.
+    :param session: сессия базы данных
+    :param after_id: id, после которого начинается выдача
+    :param fields: выбранные поля"""
+    columns = [User.id] + serializer(User, only=scalar_fields(fields)).columns()
+    if 'rank' in fields:
+        return session.query(*columns, *serializer(Rank).columns()).outerjoin(Rank, Rank.id == User.rank_id) \
+            .filter(User.id > after_id).order_by(User.id)
+    return session.query(*columns).filter(User.id > after_id).order_by(User.id)
+
+
+def scalar_fields(fields: tuple) -> tuple:
+    """Функция, возвращающая выбранные поля пользователя, которые хранятся в столбцах таблицы пользователей.
+    :param fields: выбранные поля"""
+    return tuple(field for field in fields if field not in ('rank', 'interests'))
+
+
+def load_interests(session: Session, user_ids: list) -> dict:
+    """Функция, получающая интересы порции пользователей одним запросом.
+    Возвращает словарь {id пользователя: список словарей интересов}.
+    :param session: сессия базы данных
+    :param user_ids: список id пользователей"""
+    interest_json = serializer(Interest)
+    interests = {user_id: [] for user_id in user_ids}
+    for row in session.query(user_table.c.users, *interest_json.columns()) \
+            .join(Interest, Interest.id == user_table.c.interests) \
+            .filter(user_table.c.users.in_(user_ids)):
+        interests[row[0]].append(interest_json.from_row(row, 1))
+    return interests
+
+
+def build_users(session: Session, rows: list, fields: tuple) -> list:
+    """Функция, преобразующая строки запроса users_query в словари выбранных полей пользователей.
+    Результат совпадает с to_dict(only=fields).
+    :param session: сессия базы данных
+    :param rows: строки запроса
+    :param fields: выбранные поля"""
+    user_json, rank_json = serializer(User, only=scalar_fields(fields)), serializer(Rank)
+    rank_offset = 1 + len(user_json.keys)  # столбцы ранга идут после столбцов пользователя
+    interests = load_interests(session, [row[0] for row in rows]) if 'interests' in fields else {}
+    users = []
+    for row in rows:
+        user = user_json.from_row(row, 1)
+        if 'rank' in fields:
+            user['rank'] = rank_json.from_row(row, rank_offset) if row[rank_offset] is not None else None
+        if 'interests' in fields:
+            user['interests'] = interests[row[0]]
+        users.append(user)
+    return users
+
+
+def get_users_page(session: Session, after_id: int = 0, limit: int = USERS_PAGE_SIZE,
+                   fields: tuple = USER_FIELDS) -> tuple:
+    """Функция, получающая страницу пользователей.
+    Возвращает кортеж (словари выбранных полей пользователей, есть ли следующая страница).
+    :param session: сессия базы данных
+    :param after_id: id, после которого начинается страница
+    :param limit: количество пользователей на странице
+    :param fields: выбранные поля"""
+    rows = users_query(session, after_id, fields).limit(limit + 1).all()
+    return build_users(session, rows[:limit], fields), len(rows) > limit
+
+
+def stream_users(session: Session, after_id: int = 0, fields: tuple = USER_FIELDS,
+                 chunk_size: int = USERS_STREAM_CHUNK_SIZE):
+    """Генератор, выдающий словари выбранных полей всех пользователей с id больше after_id.
+    Строки читаются курсором порциями по chunk_size, объекты моделей не создаются.
+    :param session: сессия базы данных
+    :param after_id: id, после которого начинается выдача
+    :param fields: выбранные поля
+    :param chunk_size: количество пользователей в порции"""
+    rows = iter(users_query(session, after_id, fields).yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from build_users(session, chunk, fields)
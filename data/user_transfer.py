@@ -0,0 +1,240 @@
+"""Потоковый импорт и экспорт пользователей в форматах NDJSON (один json-объект на строку) и CSV.
+Импорт читает файл порциями: каждая порция проверяется целиком, пароли хэшируются параллельно в пуле процессов,
+а пользователи и их интересы записываются одной транзакцией на порцию. Экспорт читает пользователей курсором,
+поэтому расход памяти не зависит от их количества."""
+
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+
+from data.__all_models import User, Interest
+from data.constants import PASSWORD_HASH_METHOD, USER_IMPORT_CHUNK_SIZE, USER_IMPORT_WORKERS, USER_EXPORT_CHUNK_SIZE
+from data.leaderboard import top_cache
+from data.models.interests import user_table
+from data.ranks import rank_table
+from data.typeahead import typeahead
+from data.user_keys import email_key, phone_key
+
+REQUIRED_FIELDS = ('name', 'surname', 'birthday', 'email', 'phone_number', 'password')  # обязательные поля импорта
+EXPORT_FIELDS = ('id', 'name', 'surname', 'birthday', 'email', 'phone_number', 'registration_time', 'rating',
+                 'interests')  # поля экспорта
+INTERESTS_SEPARATOR = ';'  # разделитель названий интересов в CSV
+
+
+class ImportRowError(Exception):
+    """Исключение, вызываемое, когда строка файла импорта содержит некорректные данные."""
+
+
+def guess_format(path: str) -> str:
+    """Функция, определяющая формат файла по его расширению.
+    :param path: путь до файла"""
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(file, file_format: str):
+    """Генератор, выдающий пары (номер строки, словарь данных пользователя) из файла импорта.
+    Пустые строки NDJSON пропускаются, а строки, которые не удалось разобрать, выдаются как ImportRowError.
+    :param file: открытый текстовый файл
+    :param file_format: формат файла (ndjson или csv)"""
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            row = {key: value for key, value in row.items() if value not in (None, '')}
+            if 'interests' in row:  # интересы в CSV перечислены в одной ячейке через разделитель
+                row['interests'] = [title.strip() for title in row['interests'].split(INTERESTS_SEPARATOR)
+                                    if title.strip()]
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, ImportRowError('некорректный json')
+            continue
+        yield line_number, row if isinstance(row, dict) else ImportRowError('строка должна быть json-объектом')
+
+
+def hash_password(password: str) -> str:
+    """Функция, хэширующая пароль. Выполняется в процессах пула импорта.
+    :param password: пароль"""
+    return generate_password_hash(password, PASSWORD_HASH_METHOD)
+
+
+def validate_row(row, interest_ids: dict, seen_emails: set, seen_phones: set) -> dict:
+    """Функция, проверяющая строку файла импорта и возвращающая данные нового пользователя.
+    При некорректных данных вызывает ImportRowError.
+    :param row: словарь данных пользователя (или ImportRowError, если строку не удалось разобрать)
+    :param interest_ids: id интересов по их названиям
+    :param seen_emails: ключи адресов эл. почты, уже встречавшихся в файле
+    :param seen_phones: ключи номеров телефонов, уже встречавшихся в файле"""
+    if isinstance(row, ImportRowError):
+        raise row
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ImportRowError(f'не заполнены поля {", ".join(missing)}')
+    if len(str(row['password'])) < 8:
+        raise ImportRowError('пароль короче 8 символов')
+    try:
+        birthday = datetime.fromisoformat(str(row['birthday']))
+    except ValueError:
+        raise ImportRowError('некорректная дата рождения')
+    interests = row.get('interests') or []
+    if not isinstance(interests, list):
+        raise ImportRowError('интересы должны быть списком названий')
+    unknown = [title for title in interests if title not in interest_ids]
+    if unknown:
+        raise ImportRowError(f'неизвестные интересы: {", ".join(map(str, unknown))}')
+    user = {'name': str(row['name']), 'surname': str(row['surname']), 'birthday': birthday,
+            'email': str(row['email']), 'phone_number': str(row['phone_number']), 'password': str(row['password']),
+            'interests': list(dict.fromkeys(interest_ids[title] for title in interests))}
+    user['email_key'], user['phone_key'] = email_key(user['email']), phone_key(user['phone_number'])
+    if user['email_key'] in seen_emails:
+        raise ImportRowError('адрес эл. почты повторяется в файле')
+    if user['phone_key'] in seen_phones:
+        raise ImportRowError('номер телефона повторяется в файле')
+    seen_emails.add(user['email_key'])
+    seen_phones.add(user['phone_key'])
+    return user
+
+
+def reject_taken(session: Session, chunk: list) -> list:
+    """Функция, отбрасывающая из порции пользователей, чьи контакты уже заняты в базе данных.
+    Занятость проверяется двумя запросами на порцию по индексам нормализованных контактов.
+    Возвращает список ошибок в виде пар (номер строки, описание).
+    :param session: сессия базы данных
+    :param chunk: список пар (номер строки, данные пользователя); изменяется на месте"""
+    taken_emails = {key for key, in session.query(User.email_key)
+                    .filter(User.email_key.in_([user['email_key'] for _, user in chunk]))}
+    taken_phones = {key for key, in session.query(User.phone_key)
+                    .filter(User.phone_key.in_([user['phone_key'] for _, user in chunk]))}
+    errors = []
+    for line_number, user in list(chunk):
+        if user['email_key'] in taken_emails or user['phone_key'] in taken_phones:
+            errors.append((line_number, 'адрес эл. почты занят' if user['email_key'] in taken_emails
+                           else 'номер телефона занят'))
+            chunk.remove((line_number, user))
+    return errors
+
+
+def insert_users(session: Session, users: list, hashes: list):
+    """Функция, записывающая порцию пользователей и их интересы одной транзакцией.
+    :param session: сессия базы данных
+    :param users: список данных пользователей
+    :param hashes: хэши паролей пользователей в том же порядке"""
+    rank_id = rank_table.get_rank_id(0, session)
+    now = datetime.now()
+    session.execute(User.__table__.insert(), [
+        {'name': user['name'], 'surname': user['surname'], 'birthday': user['birthday'], 'email': user['email'],
+         'phone_number': user['phone_number'], 'email_key': user['email_key'], 'phone_key': user['phone_key'],
+         'hashed_password': hashed_password, 'registration_time': now, 'rating': 0, 'rank_id': rank_id,
+         'admin': False}
+        for user, hashed_password in zip(users, hashes)])
+    # SQLite не возвращает id при пакетной вставке - находим новых пользователей по индексу адресов эл. почты
+    user_ids = dict(session.query(User.email_key, User.id)
+                    .filter(User.email_key.in_([user['email_key'] for user in users])))
+    links = [{'users': user_ids[user['email_key']], 'interests': interest_id}
+             for user in users for interest_id in user['interests']]
+    if links:
+        session.execute(user_table.insert(), links)
+    session.commit()
+
+
+def import_users(session: Session, file, file_format: str, chunk_size: int = USER_IMPORT_CHUNK_SIZE,
+                 workers: int = USER_IMPORT_WORKERS, dry_run: bool = False, progress=None) -> tuple:
+    """Функция, импортирующая пользователей из файла NDJSON или CSV.
+    Некорректные строки и строки с уже занятыми контактами пропускаются.
+    Возвращает кортеж (количество импортированных пользователей, список ошибок в виде пар (номер строки, описание)).
+    :param session: сессия базы данных
+    :param file: открытый текстовый файл
+    :param file_format: формат файла (ndjson или csv)
+    :param chunk_size: количество строк, обрабатываемых одной транзакцией
+    :param workers: количество процессов хэширования паролей (0 - по количеству процессоров)
+    :param dry_run: только проверить файл, ничего не записывая
+    :param progress: функция, вызываемая после каждой порции с количеством уже импортированных пользователей"""
+    interest_ids = {title: interest_id for interest_id, title in session.query(Interest.id, Interest.title)}
+    seen_emails, seen_phones = set(), set()
+    imported, errors = 0, []
+    rows = read_rows(file, file_format)
+    with ProcessPoolExecutor(workers or None) as pool:
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            chunk = []
+            for line_number, row in batch:
+                try:
+                    chunk.append((line_number, validate_row(row, interest_ids, seen_emails, seen_phones)))
+                except ImportRowError as error:
+                    errors.append((line_number, str(error)))
+            if chunk:
+                errors.extend(reject_taken(session, chunk))
+            if chunk and not dry_run:
+                users = [user for _, user in chunk]
+                # пароли порции хэшируются параллельно во всех процессах пула
+                hashes = list(pool.map(hash_password, [user['password'] for user in users]))
+                insert_users(session, users, hashes)
+            imported += len(chunk)
+            if progress:
+                progress(imported)
+    if imported and not dry_run:
+        top_cache.invalidate(session)  # новые пользователи могут попасть на доску почета
+        typeahead.invalidate(session)  # и должны появиться в подсказках поиска
+        session.commit()
+    return imported, sorted(errors)
+
+
+def stream_users(session: Session, chunk_size: int = USER_EXPORT_CHUNK_SIZE):
+    """Генератор, выдающий словари данных пользователей для экспорта в порядке возрастания id.
+    Пользователи читаются курсором порциями по chunk_size строк, а их интересы - одним запросом на порцию.
+    :param session: сессия базы данных
+    :param chunk_size: количество пользователей в порции"""
+    rows = iter(session.query(User.id, User.name, User.surname, User.birthday, User.email, User.phone_number,
+                              User.registration_time, User.rating).order_by(User.id).yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        interests = {}
+        for user_id, title in session.query(user_table.c.users, Interest.title) \
+                .join(Interest, Interest.id == user_table.c.interests) \
+                .filter(user_table.c.users.in_([row.id for row in chunk])):
+            interests.setdefault(user_id, []).append(title)
+        for row in chunk:
+            user = dict(zip(EXPORT_FIELDS, row))
+            user['birthday'] = user['birthday'].isoformat() if user['birthday'] else None
+            user['registration_time'] = user['registration_time'].isoformat() if user['registration_time'] else None
+            user['interests'] = interests.get(row.id, [])
+            yield user
+
+
+def export_users(session: Session, file, file_format: str, chunk_size: int = USER_EXPORT_CHUNK_SIZE,
+                 progress=None) -> int:
+    """Функция, экспортирующая всех пользователей в файл NDJSON или CSV (без хэшей паролей).
+    Возвращает количество экспортированных пользователей.
+    :param session: сессия базы данных
+    :param file: открытый на запись текстовый файл
+    :param file_format: формат файла (ndjson или csv)
+    :param chunk_size: количество пользователей, читаемых за раз
+    :param progress: функция, вызываемая после каждой порции с количеством уже экспортированных пользователей"""
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(file, EXPORT_FIELDS)
+        writer.writeheader()
+    exported = 0
+    for user in stream_users(session, chunk_size):
+        if writer:
+            user['interests'] = INTERESTS_SEPARATOR.join(user['interests'])
+            writer.writerow(user)
+        else:
+            file.write(json.dumps(user, ensure_ascii=False) + '\n')
+        exported += 1
+        if progress and exported % chunk_size == 0:
+            progress(exported)
+    return exported
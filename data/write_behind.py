@@ -0,0 +1,189 @@
+"""Очередь отложенной записи сообщений. Отправляющие потоки только ставят сообщения в очередь, а единственный
+поток записи собирает их в пачки (по размеру или по истечении нескольких миллисекунд) и фиксирует каждую пачку
+одной транзакцией, так что число синхронизаций с диском растет с числом пачек, а не сообщений."""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from data.__all_models import User
+from data.constants import WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_MAX_DELAY, WRITE_BEHIND_QUEUE_SIZE, \
+    WRITE_BEHIND_TIMEOUT, WRITE_BEHIND_DURABILITY, WRITE_BEHIND_RETRIES, WRITE_BEHIND_RETRY_DELAY
+from data.db_session import create_session
+from data.messaging import send_message, store_messages
+
+DURABILITY_QUEUED = 'queued'  # подтверждать отправку сразу после постановки сообщения в очередь
+DURABILITY_COMMITTED = 'committed'  # подтверждать отправку только после фиксации транзакции с сообщением
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindUnavailable(Exception):
+    """Исключение, вызываемое, когда запись сообщения не подтверждена вовремя или транзакция с ним не удалась."""
+
+
+class WriteBehindQueue:
+    """Класс очереди отложенной записи сообщений с групповой фиксацией."""
+
+    def __init__(self, batch_size: int = WRITE_BEHIND_BATCH_SIZE, max_delay: float = WRITE_BEHIND_MAX_DELAY,
+                 max_size: int = WRITE_BEHIND_QUEUE_SIZE, retries: int = WRITE_BEHIND_RETRIES,
+                 retry_delay: float = WRITE_BEHIND_RETRY_DELAY):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # элементы очереди: (id отправителя, id получателя, текст, объект ожидания результата); None - сигнал остановки
+        self._queue = queue.Queue(max_size)
+        self._thread = None
+
+    def start(self):
+        """Метод, запускающий поток записи."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def submit(self, sender_id: int, to_id: int, text: str) -> Future:
+        """Метод, ставящий сообщение в очередь на запись. Если очередь переполнена, ждет освобождения места.
+        Возвращает объект ожидания, результатом которого станет id сообщения (None, если получатель не найден).
+        :param sender_id: id отправителя
+        :param to_id: id получателя
+        :param text: текст сообщения"""
+        if self._thread is None:
+            raise RuntimeError('Write-behind queue is not running')
+        future = Future()
+        self._queue.put((sender_id, to_id, text, future))
+        return future
+
+    def flush(self, timeout: float = None) -> bool:
+        """Метод, ожидающий записи всех сообщений, поставленных в очередь до его вызова.
+        Возвращает False, если время ожидания истекло.
+        :param timeout: максимальное время ожидания в секундах"""
+        if self._thread is None:
+            return True
+        try:
+            self.submit(0, 0, None).result(timeout)  # пустой элемент отмечает конец уже поставленных сообщений
+        except FutureTimeoutError:
+            return False
+        return True
+
+    def stop(self, timeout: float = None):
+        """Метод, записывающий все оставшиеся в очереди сообщения и останавливающий поток записи.
+        :param timeout: максимальное время ожидания в секундах"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _collect(self) -> tuple:
+        """Метод, собирающий очередную пачку сообщений.
+        Ждет первое сообщение без ограничения времени, а остальные - не дольше max_delay.
+        Возвращает кортеж (пачка, получен ли сигнал остановки)."""
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        """Метод потока записи: фиксирует пачки сообщений, пока не получит сигнал остановки."""
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            messages = [item for item in batch if item[2] is not None]  # отделяем сообщения от отметок flush
+            if messages:
+                self._write(messages)
+            for item in batch:
+                if item[2] is None:
+                    item[3].set_result(None)
+
+    def _write(self, batch: list):
+        """Метод, фиксирующий пачку сообщений одной транзакцией и сообщающий результат отправителям.
+        Неудавшаяся транзакция (например, база заблокирована) повторяется до retries раз; если пачку так и не
+        удалось записать, ошибка записывается в журнал и передается отправителям.
+        :param batch: список элементов очереди"""
+        for attempt in range(self.retries + 1):
+            session = create_session()
+            try:
+                message_ids = store_messages(session, [(sender_id, to_id, text)
+                                                       for sender_id, to_id, text, _ in batch])
+            except Exception as error:
+                session.rollback()
+                if attempt < self.retries:
+                    logger.warning('Write-behind batch of %d messages failed (attempt %d), retrying: %s',
+                                   len(batch), attempt + 1, error)
+                    time.sleep(self.retry_delay * (attempt + 1))
+                    continue
+                # сообщения, подтвержденные сразу после постановки в очередь, никто не ждет - фиксируем потерю в журнале
+                logger.error('Write-behind batch of %d messages was dropped after %d attempts',
+                             len(batch), attempt + 1, exc_info=error)
+                for *_, future in batch:
+                    future.set_exception(error)
+            else:
+                for (*_, future), message_id in zip(batch, message_ids):
+                    future.set_result(message_id)
+                return
+            finally:
+                session.close()
+
+
+writer = None  # очередь отложенной записи (None, если сообщения записываются сразу)
+
+
+def enable_write_behind(batch_size: int = WRITE_BEHIND_BATCH_SIZE, max_delay: float = WRITE_BEHIND_MAX_DELAY,
+                        max_size: int = WRITE_BEHIND_QUEUE_SIZE) -> WriteBehindQueue:
+    """Функция, включающая отложенную запись сообщений. При завершении процесса оставшиеся в очереди
+    сообщения записываются в базу данных.
+    :param batch_size: максимальное количество сообщений в одной транзакции
+    :param max_delay: максимальное время накопления пачки в секундах
+    :param max_size: максимальное количество сообщений, ожидающих записи"""
+    global writer
+
+    if writer is None:
+        writer = WriteBehindQueue(batch_size, max_delay, max_size)
+        writer.start()
+        atexit.register(writer.stop)  # записываем оставшиеся сообщения при завершении процесса
+    return writer
+
+
+def submit_message(session, sender_id: int, to_id: int, text: str, durability: str = WRITE_BEHIND_DURABILITY):
+    """Функция, отправляющая сообщение сразу или через очередь отложенной записи (если она включена).
+    Возвращает id сообщения или None, если сообщение еще только поставлено в очередь.
+    Если получателя не существует, вызывает LookupError, если указан неизвестный режим подтверждения - ValueError,
+    а если запись не подтверждена вовремя или не удалась - WriteBehindUnavailable.
+    :param session: сессия базы данных
+    :param sender_id: id отправителя
+    :param to_id: id получателя
+    :param text: текст сообщения
+    :param durability: момент подтверждения отправки при отложенной записи ('queued' или 'committed')"""
+    if durability not in (DURABILITY_QUEUED, DURABILITY_COMMITTED):
+        raise ValueError(f'Unknown durability: {durability}')
+    if writer is None:
+        return send_message(session, sender_id, to_id, text).id
+    if durability == DURABILITY_QUEUED:
+        # подтверждаем отправку, не дожидаясь записи, поэтому получателя проверяем заранее
+        if session.query(User).get(to_id) is None:
+            raise LookupError(f'User {to_id} not found')
+        writer.submit(sender_id, to_id, text)
+        return None
+    try:
+        message_id = writer.submit(sender_id, to_id, text).result(WRITE_BEHIND_TIMEOUT)
+    except FutureTimeoutError as error:
+        raise WriteBehindUnavailable('Message write was not confirmed in time') from error
+    except Exception as error:  # транзакция с пачкой сообщения не удалась
+        raise WriteBehindUnavailable('Message write failed') from error
+    if message_id is None:
+        raise LookupError(f'User {to_id} not found')
+    return message_id
@@ -1,16 +1,35 @@
 import datetime
+import json
 import os
 
-from flask import Flask, render_template, redirect, url_for, abort, request, make_response
+from flask import Flask, render_template, redirect, url_for, abort, request, make_response, Response, \
+    jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 
 from api import api_blueprint
+from data.ads_feed import ads_feed
+from data.archive import archive_init
+from data.chat_history import get_chat_page, parse_page_args
 from data.__all_models import *
 from data.constants import *
+from data.conversations import mark_conversation_read, get_conversation, get_conversations
 from data.db_session import create_session, global_init
 from data.forms import LoginForm, RegistrationForm, AdvertisementForm, MessageForm, AvatarForm, ResetPasswordForm, \
     SetupProfileForm, SearchForm
+from data.identity_cache import user_cache
+from data.leaderboard import get_leaderboard_position, top_cache
+from data.message_search import parse_search_args, search_messages
+from data.notifications import hub
+from data.passwords import PasswordHasherBusy
+from data.people_search import search_users
+from data.ranks import rank_table
+from data.rating_rollups import get_window_top, schedule_rollups
+from data.repositories import email_taken, get_profile
+from data.serializers import serializer
+from data.typeahead import typeahead
+from data.write_behind import WriteBehindUnavailable, enable_write_behind, submit_message
 
 """Webby v1.0"""
 
@@ -29,9 +48,8 @@ def index():
     if not current_user.is_authenticated:  # проверяем аутентифицирован ли пользователь
         return render_template('roadmap.html')  # если нет - показываем ему планы разработчиков
     # в ином случае - показываем клиенту актуальные объявления
-    session = create_session()
-    advertisements = session.query(Advertisement).all()[::-1][:6]  # получаем список последних 5 объявлений
-    return render_template('actual_ads.html', ads=advertisements)
+    feed = ads_feed.render(current_user.id)  # получаем отрисованную ленту последних объявлений
+    return render_template('actual_ads.html', feed=feed)
 
 
 @app.route('/info')
@@ -56,17 +74,21 @@ def api_docs():
 def top():
     """Обработчик странциы доски почёта."""
     session = create_session()
-    users = session.query(User).order_by(User.rating.desc()).filter(User.rating > 0).limit(
-        100)  # получаем список 100 пользователей, упорядоченных по рейтингу
-    return render_template('top.html', top_users=users)
+    window = request.args.get('period')  # получаем промежуток времени, за который нужна доска почета
+    if window is None:
+        users = top_cache.get(session)  # получаем список лучших пользователей из кэша доски почета
+    elif window in RATING_WINDOWS:
+        users = get_window_top(session, window)  # получаем список пользователей, набравших больше всего за промежуток
+    else:
+        return abort(400)
+    return render_template('top.html', top_users=users, period=window)
 
 
 @login_manager.user_loader
 def load_user(user_id):
     """Функция для загрузки объекта User в current_user для последующего испольования.
     :param user_id: id клиента"""
-    session = create_session()
-    return session.query(User).get(user_id)
+    return user_cache.get(user_id)  # берем клиента из кэша пользователей процесса
 
 
 @app.route('/register', methods=["POST", "GET"])
@@ -84,10 +106,20 @@ def register():
         user.email = form.email_field.data
         user.phone_number = form.phone_number_field.data
         user.set_password(form.password_field.data)
-        user.rank = session.query(Rank).filter(Rank.id == 1).first()
+        user.rank_id = rank_table.get_rank_id(0, session)  # новый пользователь получает начальный ранг
 
         session.add(user)
-        session.commit()
+        try:
+            version = typeahead.touch(session)  # новый пользователь появляется в подсказках поиска
+            session.commit()
+        except IntegrityError:  # адрес или номер успели занять, пока мы проверяли форму и хэшировали пароль
+            session.rollback()
+            if email_taken(session, form.email_field.data):
+                form.email_field.errors.append('Пользователь с таким  адресом эл. почты уже существует')
+            else:
+                form.phone_number_field.errors.append('Пользователь с таким номером телефона уже существует')
+            return render_template('registration.html', form=form)
+        typeahead.apply(user, version)
         return redirect('/')
     return render_template('registration.html', form=form)
 
@@ -102,6 +134,9 @@ def login():
             User.email == form.email_field.data).first()  # ищем пользователя с введенным email
         if user and user.check_password(
                 form.password_field.data):  # проверяем, найден ли такой пользователь и верен ли введенный пароль
+            if user.rehash_password(form.password_field.data):  # пересчитываем хэш, созданный с устаревшими параметрами
+                session.commit()
+                user_cache.invalidate(user.id)
             # если все данные введены правильно - авторизируем пользователя
             login_user(user, remember=form.remember_me.data)
             return redirect('/')
@@ -119,10 +154,10 @@ def reset_password():
         user = session.query(User).filter(
             User.email == form.email_field.data).first()  # ищем пользователя с введенным email
         if user:  # проверяем, найден ли такой пользователь
-            if not user.check_password(
-                    form.password_field.data):  # проверяем, соответствует ли введенный пароль предыдущему
-                user.set_password(form.password_field.data)  # если введенные данные прошли все проверки - меняем пароль
+            # меняем пароль, если введенный пароль не соответствует предыдущему (проверка и хэширование - одна операция)
+            if user.replace_password(form.password_field.data):
                 session.commit()
+                user_cache.invalidate(user.id)  # пароль изменился - убираем пользователя из кэша
                 return redirect('/login')
             # если пароль идентичен предыдущему - возвращаем сообщение об ошибке
             return render_template('reset_password.html', form=form, message="Пароль идентичен предыдущему")
@@ -139,23 +174,20 @@ def logout():
     return redirect('/')
 
 
-def count_rating_raise(content: str) -> int:
-    to_rate = len(content)
-    overall_raise = 0
-    for i in reversed(RATE.keys()):
-        if i != 1:
-            while to_rate >= i:
-                overall_raise += RATE[i]
-                to_rate -= i
-    overall_raise += (to_rate % 10) / 10
-    return overall_raise
-
-
-def get_rank_by_rating(rating: int, session) -> int:
-    for i in reversed(RANKS.keys()):
-        if rating >= i:
-            rank = session.query(Rank).filter(Rank.title == RANKS[i]).first()
-            return rank.id
+@app.route('/chats/search')
+@login_required
+def search_messages_page():
+    """Обработчик страницы поиска по сообщениям клиента."""
+    try:  # получаем поисковый запрос и номер страницы результатов
+        query, page, limit = parse_search_args(request.args)
+    except ValueError:
+        return abort(400)
+    if not query:  # проверяем, ввел ли клиент поисковый запрос
+        return render_template('message_search.html', query=query)
+    session = create_session()
+    # ищем сообщения с введенным текстом среди диалогов клиента
+    messages, has_more = search_messages(session, current_user.id, query, page, limit)
+    return render_template('message_search.html', query=query, messages=messages, page=page, has_more=has_more)
 
 
 @app.route('/chats/<int:user_id>', methods=['POST', 'GET'])
@@ -165,60 +197,82 @@ def chat(user_id):
     :param user_id: id собеседника"""
     form = MessageForm()  # создаем форму ввода сообщения
     session = create_session()
+    try:  # получаем параметры запрошенной страницы переписки
+        before_id, after_id, limit = parse_page_args(request.args)
+    except ValueError:
+        return abort(400)
+    if before_id is None and after_id is None:  # проверяем, открывает ли клиент последние сообщения чата
+        # если да - отмечаем диалог прочитанным (до загрузки страницы, чтобы фиксация не сбросила загруженные объекты)
+        mark_conversation_read(session, current_user.id, user_id)
     companion = session.query(User).filter(User.id == user_id).first()  # получаем объект собеседника по его id
     if not companion:  # проверяем, найден ли собеседник
         return abort(404)  # если нет - отображаем страницу с ошибкой 404
-    # получаем список всех сообщений между клиентом и собеседником
-    messages = session.query(Message).filter(((Message.to_id == current_user.id) & (Message.from_id == user_id)) |
-                                             ((Message.from_id == current_user.id) & (Message.to_id == user_id))).all()
-    sender = session.query(User).filter(User.id == current_user.id).first()  # получаем объект текущего пользователя
     if form.validate_on_submit():
-        # создаем объект контента и заполняем его текстом сообщения
-        cnt = Content()
-        cnt.content = form.message_field.data
-        session.add(cnt)
-        session.commit()
-        # рассчитываем надбавку к рейтингу
-        sender.rating += count_rating_raise(cnt.content)
-        sender.rating = round(sender.rating, 1)
-        # присваиваем пользователю ранг, опираясь на его рейтинг
-        sender.rank_id = get_rank_by_rating(sender.rating, session)
-        session.commit()
-        # создаем объект сообщения и заполняем все необходимые поля
-        msg = Message()
-        msg.to_id = user_id
-        msg.from_id = current_user.id
-        msg.content_id = cnt.id
-        session.add(msg)
-        session.commit()
+        # отправляем сообщение собеседнику (рейтинг и ранг клиента обновляются вместе с ним)
+        submit_message(session, current_user.id, user_id, form.message_field.data)
         return redirect(f"/chats/{user_id}")
-    return render_template('chats.html', form=form, messages=messages, companion=companion)
+    # получаем страницу сообщений между клиентом и собеседником (по умолчанию - самые новые)
+    messages, has_more = get_chat_page(session, current_user.id, user_id, before_id, after_id, limit)
+    conversation = get_conversation(session, current_user.id, user_id)  # получаем отметку прочтения собеседника
+    return render_template('chats.html', form=form, messages=messages, companion=companion,
+                           companion_read_id=conversation.last_read_for(user_id) if conversation else 0,
+                           has_older=has_more if after_id is None else True,
+                           has_newer=before_id is not None or (after_id is not None and has_more))
+
+
+@app.route('/chats/<int:user_id>/stream')
+@login_required
+def chat_stream(user_id):
+    """Обработчик потока событий (Server-Sent Events) с новыми сообщениями чата.
+    :param user_id: id собеседника"""
+    client_id = current_user.id
+    try:  # получаем id последнего сообщения, известного клиенту (при переподключении его передает сам браузер)
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('after_id')
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return abort(400)
+    if last_id is None:  # если клиент не указал последнее сообщение - отдаем только сообщения, отправленные позже
+        session = create_session()
+        newest, _ = get_chat_page(session, client_id, user_id, limit=1)
+        session.close()
+        last_id = newest[-1].id if newest else 0
+
+    message_json = serializer(Message)
+
+    def events():
+        nonlocal last_id
+        while True:
+            # получаем из базы только сообщения, которых еще нет у клиента
+            session = create_session()
+            try:  # закрываем сессию и при обрыве соединения клиентом
+                messages, has_more = get_chat_page(session, client_id, user_id, after_id=last_id,
+                                                   limit=MESSAGES_MAX_PAGE_SIZE)
+                for msg in messages:
+                    yield f"id: {msg.id}\nevent: message\ndata: {json.dumps(message_json(msg), ensure_ascii=False)}\n\n"
+                    last_id = msg.id
+                if messages:  # сообщения, показанные в открытом чате, считаются прочитанными
+                    mark_conversation_read(session, client_id, user_id, last_id)
+            finally:
+                session.close()
+            # ждем новых сообщений; концентратор уведомлений будит только о сообщениях, отправленных через этот
+            # процесс, поэтому по истечении интервала отправляем служебное сообщение (чтобы соединение не закрылось)
+            # и снова проверяем базу - так доходят и сообщения, отправленные через другие процессы
+            if not has_more and not hub.wait(client_id, user_id, last_id, SSE_KEEPALIVE):
+                yield ': keep-alive\n\n'
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/chats', methods=['GET', 'POST'])
 @login_required
 def chats():
     """Обработчик страницы со всеми чатами пользователя."""
-    from itertools import groupby
-
     session = create_session()
-    # получаем все полученные и отправленные сообщения
-    messages = session.query(Message).filter((Message.to_id == current_user.id) |
-                                             (Message.from_id == current_user.id)).all()
-    # получаем всех собеседников клиента
-    companions = sorted([msg.sender if msg.sender != current_user else msg.receiver for msg in messages],
-                        key=lambda x: x.name)
-    companions = list(reversed([user[0] for user in groupby(companions)]))
-    last_messages = []
-    for user in companions:
-        # получаем последние сообщения в чатах клиента
-        last_messages.append(session.query(Message).filter(((Message.to_id == current_user.id) &
-                                                            (Message.from_id == user.id)) |
-                                                           ((Message.from_id == current_user.id) &
-                                                            (Message.to_id == user.id))).all()[-1])
-    # сортируем полученные сообщения по времени отправления
-    chats_list = sorted([[companions[i], last_messages[i]] for i in range(len(companions))],
-                        key=lambda x: x[1].created_at)[::-1]
+    # получаем все диалоги клиента, упорядоченные по времени последнего сообщения
+    conversations = get_conversations(session, current_user.id)
+    chats_list = [[conv.companion(current_user.id), conv.last_message, conv.unread_for(current_user.id)]
+                  for conv in conversations]
     return render_template('chats_list.html', chats_list=chats_list)
 
 
@@ -227,17 +281,33 @@ def chats():
 def search():
     """Обработчик страницы поиска со всеми собеседниками."""
     form = SearchForm()  # создаем форму поиска
-    if form.validate_on_submit():
-        session = create_session()
-        # ищем пользователя по его фамилии/имени/телефонному номеру
-        users = session.query(User).filter((User.name.like(f"{form.filter_field.data}%")) |
-                                           (User.surname.like(f"{form.filter_field.data}%")) |
-                                           (User.phone_number.like(f"{form.filter_field.data}%"))).all()
-        if not users:  # проверяем, нашлись ли пользователи по введенным данным
-            # если нет - даем клиенту об этом знать
-            return render_template('search.html', form=form, message='Предложений по поиску нет')
-        return render_template('search.html', form=form, users=users)
-    return render_template('search.html', form=form)
+    if form.validate_on_submit():  # отправка формы открывает первую страницу результатов поиска
+        return redirect(url_for('search', q=form.filter_field.data.strip()))
+    try:  # получаем поисковый запрос и номер страницы результатов
+        query, page, limit = parse_search_args(request.args)
+    except ValueError:
+        return abort(400)
+    if not query:  # проверяем, ввел ли клиент поисковый запрос
+        return render_template('search.html', form=form)
+    form.filter_field.data = query
+    session = create_session()
+    # ищем пользователя по его фамилии/имени/телефонному номеру
+    users, has_more = search_users(session, query, page, limit)
+    if not users and page == 1:  # проверяем, нашлись ли пользователи по введенным данным
+        # если нет - даем клиенту об этом знать
+        return render_template('search.html', form=form, message='Предложений по поиску нет')
+    return render_template('search.html', form=form, users=users, query=query, page=page, has_more=has_more)
+
+
+@app.route('/search/suggest')
+@login_required
+def search_suggest():
+    """Обработчик запроса подсказок при вводе в поиске пользователей."""
+    query = request.args.get('q', '').strip()
+    # ищем пользователей по началу имени/фамилии/телефонного номера в индексе подсказок процесса
+    suggestions = typeahead.complete(query) if query else []
+    return jsonify({'users': [{'id': user_id, 'name': name, 'surname': surname}
+                              for user_id, name, surname in suggestions]})
 
 
 @app.route('/profile/<int:user_id>')
@@ -246,17 +316,12 @@ def show_profile(user_id):
     """Обработчик страницы профиля.
     :param user_id: id пользователя, чей профиль нужен клиенту"""
     session = create_session()
-    user = session.query(User).filter(User.id == user_id).first()  # получаем данные профиля пользователя с указанным id
+    user = get_profile(session, user_id)  # получаем данные профиля пользователя с указанным id
     if not user:  # проверяем, найден ли пользователь
         # если нет - показываем страницу с ошибкой
         return abort(404)
     # получаем место пользователя на доске почета
-    all_users = session.query(User).order_by(User.rating.desc())
-    position = 1
-    for i in all_users:
-        if i.id == user.id:
-            break
-        position += 1
+    position = get_leaderboard_position(session, user)
     # получаем аватар пользователя
     pic = session.query(Avatar).filter(Avatar.refers_to == user_id).first()
     if pic:  # проверяем, найден ли аватар
@@ -323,11 +388,21 @@ def set_profile(user_id):
         user.surname = form.surname_field.data
         user.birthday = form.birthday_field.data
         user.phone_number = form.phone_number_field.data
+        try:
+            session.flush()  # уникальность нормализованного номера проверяется индексом при записи
+        except IntegrityError:  # номер телефона принадлежит другому пользователю
+            session.rollback()
+            form.phone_number_field.errors.append('Пользователь с таким номером телефона уже существует')
+            return render_template('profile_settings.html', form=form)
         user.interests.clear()
         for tag in form.interests_field.data:
             tag_obj = session.query(Interest).filter(Interest.title == tag).first()
             user.interests.append(tag_obj)
+        top_cache.invalidate(session)  # имя пользователя могло измениться - обновляем доску почета
+        version = typeahead.touch(session)  # имя или номер телефона могли измениться - обновляем подсказки поиска
         session.commit()
+        user_cache.invalidate(user_id)  # профиль изменился - убираем пользователя из кэша
+        typeahead.apply(user, version)
         return redirect(f'/profile/{user_id}')
     return render_template('profile_settings.html', form=form)
 
@@ -358,6 +433,7 @@ def create_advertisement():
             ad.interests.append(tag_obj)
         session.add(ad)
         session.commit()
+        ads_feed.invalidate()
         return redirect('/')
     return render_template('ad_form.html', form=form)
 
@@ -395,6 +471,7 @@ def edit_advertisement(ad_id):
         for tag in form.tags_field.raw_data:
             advertisement.interests.append(session.query(Interest).filter(Interest.title == tag).first())
         session.commit()
+        ads_feed.invalidate()
         return redirect('/')
     return render_template('ad_form.html', form=form)
 
@@ -413,6 +490,7 @@ def delete_advertisement(ad_id):
         return abort(403)  # если клиент не является автором - показываем страницу с ошибкой
     session.delete(advertisement)
     session.commit()
+    ads_feed.invalidate()
     return redirect('/')
 
 
@@ -444,6 +522,17 @@ def handle_404(error):
     return response
 
 
+@app.errorhandler(PasswordHasherBusy)
+@app.errorhandler(WriteBehindUnavailable)
+def handle_server_busy(error):
+    """Обработчик перегрузки пула хэширования паролей или очереди записи сообщений.
+    :param error: исключение"""
+    response = make_response(render_template('errorhandler.html', error='Ошибка 503.', http_error=error,
+                                             message='Сервер перегружен. Пожалуйста, повторите попытку позже.'))
+    response.status_code = 503
+    return response
+
+
 @app.errorhandler(405)
 def handle_405(error):
     """Обработчик ошибки 405.
@@ -453,5 +542,11 @@ def handle_405(error):
 
 if __name__ == '__main__':
     global_init('db/chats_db.sqlite')  # инициализируем базу данных
+    archive_init(ARCHIVE_DB_FILE)  # подключаем архив старых сообщений
+    rank_table.refresh(create_session())  # строим таблицу рангов (и добавляем недостающие ранги в базу)
+    typeahead.build(create_session())  # строим индекс подсказок поиска пользователей
+    schedule_rollups()  # запускаем периодическую свертку журнала рейтинга
+    if WRITE_BEHIND_ENABLED:  # включаем отложенную запись сообщений с групповой фиксацией
+        enable_write_behind()
     app.register_blueprint(api_blueprint, url_prefix='/api')  # загружаем обработчики API
     app.run('127.0.0.1', 8080)  # запускаем приложение
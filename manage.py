@@ -0,0 +1,154 @@
+"""Служебные команды Webby. Запуск: python manage.py <команда>"""
+
+import argparse
+import os
+import sys
+
+from data.constants import ARCHIVE_DB_FILE, ARCHIVE_AFTER_DAYS, ARCHIVE_SEGMENT_SIZE, RECOMPUTE_CHUNK_SIZE, \
+    USER_IMPORT_CHUNK_SIZE, USER_IMPORT_WORKERS, USER_EXPORT_CHUNK_SIZE
+from data.db_session import create_session, global_init
+
+DEFAULT_DB = 'db/chats_db.sqlite'  # база данных, с которой работает приложение
+
+
+def backfill_conversations(args):
+    """Команда, заново строящая таблицу диалогов по уже существующим сообщениям.
+    :param args: аргументы командной строки"""
+    from data.conversations import backfill_conversations as backfill
+
+    session = create_session()
+    print(f'Построено диалогов: {backfill(session)}')
+
+
+def archive_messages(args):
+    """Команда, переносящая старые сообщения в архив.
+    :param args: аргументы командной строки"""
+    from data.archive import archive_init, archive_old_messages, create_archive_session
+
+    archive_init(args.archive)  # подключаем архив старых сообщений
+    session, archive_session = create_session(), create_archive_session()
+    archived = archive_old_messages(session, archive_session, args.days, args.segment_size,
+                                    progress=lambda count: print(f'Перенесено сообщений: {count}', end='\r'))
+    print(f'Перенесено в архив сообщений: {archived}')
+
+
+def recompute_ratings(args):
+    """Команда, пересчитывающая рейтинг и ранг всех пользователей по истории их сообщений.
+    :param args: аргументы командной строки"""
+    from data.archive import archive_init
+    from data.rating_recompute import recompute_ratings as recompute
+
+    if os.path.exists(args.archive):  # архивные сообщения тоже учитываются в рейтинге
+        archive_init(args.archive)
+    changes = recompute(create_session(), args.chunk_size, args.dry_run,
+                        progress=lambda count: print(f'Обработано сообщений: {count}', end='\r'))
+    print()
+    if args.dry_run:  # в режиме проверки выводим все изменения, которые были бы записаны
+        for user_id, rating, new_rating, rank_id, new_rank_id in changes:
+            print(f'{user_id}: рейтинг {rating} -> {new_rating}, ранг {rank_id} -> {new_rank_id}')
+    print(f'{"Будет изменено" if args.dry_run else "Изменено"} пользователей: {len(changes)}')
+
+
+def rollup_ratings(args):
+    """Команда, сворачивающая журнал изменений рейтинга в почасовые и посуточные суммы.
+    :param args: аргументы командной строки"""
+    from data.rating_rollups import rollup_ratings as rollup
+
+    rollup(create_session())
+    print('Журнал рейтинга свернут')
+
+
+def import_users(args):
+    """Команда, импортирующая пользователей из файла NDJSON или CSV.
+    :param args: аргументы командной строки"""
+    from data.user_transfer import guess_format, import_users as import_file
+
+    file_format = args.format or guess_format(args.file)
+    with (sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', newline='')) as file:
+        imported, errors = import_file(create_session(), file, file_format, args.chunk_size, args.workers,
+                                       args.dry_run,
+                                       progress=lambda count: print(f'Обработано пользователей: {count}', end='\r'))
+    print()
+    for line_number, error in errors:  # выводим строки, которые не были импортированы
+        print(f'строка {line_number}: {error}', file=sys.stderr)
+    print(f'{"Прошло проверку" if args.dry_run else "Импортировано"} пользователей: {imported}, '
+          f'пропущено строк: {len(errors)}')
+
+
+def export_users(args):
+    """Команда, экспортирующая всех пользователей в файл NDJSON или CSV.
+    :param args: аргументы командной строки"""
+    from data.user_transfer import guess_format, export_users as export_file
+
+    file_format = args.format or guess_format(args.file)
+    with open(args.file, 'w', encoding='utf-8', newline='') as file:
+        exported = export_file(create_session(), file, file_format, args.chunk_size,
+                               progress=lambda count: print(f'Экспортировано пользователей: {count}', end='\r'))
+    print(f'Экспортировано пользователей: {exported}')
+
+
+def benchmark_serializers(args):
+    """Команда, сравнивающая скорость скомпилированных сериализаторов API и to_dict() на данных базы.
+    :param args: аргументы командной строки"""
+    from data.serializer_benchmark import benchmark_serializers as benchmark
+
+    print(f'{"Модель":<16}{"Объектов":>10}{"to_dict, мкс":>15}{"скомпилированный, мкс":>24}{"ускорение":>12}')
+    for name, count, slow, fast in benchmark(create_session(), args.limit, args.repeat):
+        print(f'{name:<16}{count:>10}{slow:>15.1f}{fast:>24.1f}{slow / fast:>11.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Служебные команды Webby')
+    parser.add_argument('--db', default=DEFAULT_DB, help='путь до файла базы данных')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('backfill_conversations', help='построить таблицу диалогов по таблице сообщений') \
+        .set_defaults(handler=backfill_conversations)
+
+    archive = commands.add_parser('archive_messages', help='перенести старые сообщения в архив')
+    archive.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='возраст сообщений в днях')
+    archive.add_argument('--segment-size', type=int, default=ARCHIVE_SEGMENT_SIZE,
+                         help='максимальное количество сообщений в сегменте архива')
+    archive.add_argument('--archive', default=ARCHIVE_DB_FILE, help='путь до файла базы данных архива')
+    archive.set_defaults(handler=archive_messages)
+
+    recompute = commands.add_parser('recompute_ratings', help='пересчитать рейтинг и ранги по истории сообщений')
+    recompute.add_argument('--chunk-size', type=int, default=RECOMPUTE_CHUNK_SIZE,
+                           help='количество сообщений, читаемых за раз')
+    recompute.add_argument('--dry-run', action='store_true', help='только показать изменения, ничего не записывая')
+    recompute.add_argument('--archive', default=ARCHIVE_DB_FILE, help='путь до файла базы данных архива')
+    recompute.set_defaults(handler=recompute_ratings)
+
+    commands.add_parser('rollup_ratings', help='свернуть журнал изменений рейтинга в почасовые и посуточные суммы') \
+        .set_defaults(handler=rollup_ratings)
+
+    user_import = commands.add_parser('import_users', help='импортировать пользователей из файла NDJSON или CSV')
+    user_import.add_argument('file', help='путь до файла (- для стандартного ввода)')
+    user_import.add_argument('--format', choices=('ndjson', 'csv'), help='формат файла (по умолчанию - по расширению)')
+    user_import.add_argument('--chunk-size', type=int, default=USER_IMPORT_CHUNK_SIZE,
+                             help='количество пользователей, записываемых одной транзакцией')
+    user_import.add_argument('--workers', type=int, default=USER_IMPORT_WORKERS,
+                             help='количество процессов хэширования паролей (0 - по количеству процессоров)')
+    user_import.add_argument('--dry-run', action='store_true', help='только проверить файл, ничего не записывая')
+    user_import.set_defaults(handler=import_users)
+
+    user_export = commands.add_parser('export_users', help='экспортировать пользователей в файл NDJSON или CSV')
+    user_export.add_argument('file', help='путь до файла')
+    user_export.add_argument('--format', choices=('ndjson', 'csv'), help='формат файла (по умолчанию - по расширению)')
+    user_export.add_argument('--chunk-size', type=int, default=USER_EXPORT_CHUNK_SIZE,
+                             help='количество пользователей, читаемых за раз')
+    user_export.set_defaults(handler=export_users)
+
+    bench = commands.add_parser('benchmark_serializers',
+                                help='сравнить скорость скомпилированных сериализаторов API и to_dict()')
+    bench.add_argument('--limit', type=int, default=1000, help='максимальное количество объектов каждой модели')
+    bench.add_argument('--repeat', type=int, default=5, help='количество повторов замера')
+    bench.set_defaults(handler=benchmark_serializers)
+
+    args = parser.parse_args()
+    global_init(args.db)  # инициализируем базу данных
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
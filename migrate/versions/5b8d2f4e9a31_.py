@@ -0,0 +1,40 @@
+"""users full-text index
+
+Revision ID: 5b8d2f4e9a31
+Revises: 3e9b7c1d5a62
+Create Date: 2026-10-19 00:21:37.504718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2f4e9a31'
+down_revision = '3e9b7c1d5a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # префиксные индексы на 2 и 3 символа ускоряют поиск по началу слова
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS users_fts "
+               "USING fts5(name, surname, phone, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+    op.execute("CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+               "INSERT INTO users_fts (rowid, name, surname, phone) "
+               "VALUES (new.id, new.name, new.surname, new.phone_key); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, surname, phone_key ON users BEGIN "
+               "DELETE FROM users_fts WHERE rowid = old.id; "
+               "INSERT INTO users_fts (rowid, name, surname, phone) "
+               "VALUES (new.id, new.name, new.surname, new.phone_key); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+               "DELETE FROM users_fts WHERE rowid = old.id; END")
+    # индексируем уже зарегистрированных пользователей
+    op.execute("INSERT INTO users_fts (rowid, name, surname, phone) SELECT id, name, surname, phone_key FROM users")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS users_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS users_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS users_fts_insert")
+    op.execute("DROP TABLE IF EXISTS users_fts")
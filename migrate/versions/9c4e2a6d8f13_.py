@@ -0,0 +1,35 @@
+"""messages full-text index
+
+Revision ID: 9c4e2a6d8f13
+Revises: 7b3d9e1f4a20
+Create Date: 2026-10-18 21:05:49.127604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2a6d8f13'
+down_revision = '7b3d9e1f4a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+               "USING fts5(content, tokenize = 'unicode61 remove_diacritics 2')")
+    op.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+               "INSERT INTO messages_fts (rowid, content) SELECT new.id, contents.content FROM contents "
+               "WHERE contents.id = new.content_id; END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+               "DELETE FROM messages_fts WHERE rowid = old.id; END")
+    # индексируем уже существующие сообщения
+    op.execute("INSERT INTO messages_fts (rowid, content) SELECT messages.id, contents.content FROM messages "
+               "JOIN contents ON contents.id = messages.content_id")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+    op.execute("DROP TABLE IF EXISTS messages_fts")
@@ -0,0 +1,34 @@
+// подписываемся на поток новых сообщений чата и дописываем их в конец переписки без перезагрузки страницы
+(function () {
+    const box = document.querySelector('.message_box[data-stream-url]');
+    if (!box || !window.EventSource) {
+        return;
+    }
+    const names = {};
+    names[box.dataset.userId] = box.dataset.userName;
+    names[box.dataset.companionId] = box.dataset.companionName;
+    let lastSender = box.dataset.lastSender;
+
+    const source = new EventSource(box.dataset.streamUrl);
+    source.addEventListener('message', function (event) {
+        const msg = JSON.parse(event.data);
+        const item = document.createElement('div');
+        if (String(msg.from_id) !== lastSender) {
+            // как и при отрисовке страницы, подписываем сообщение, только если сменился отправитель
+            const author = document.createElement('b');
+            const link = document.createElement('a');
+            link.href = '/profile/' + msg.from_id;
+            link.className = 'text-reset';
+            link.textContent = names[msg.from_id];
+            author.appendChild(link);
+            const time = document.createElement('span');
+            time.className = 'text-secondary';
+            time.textContent = ' ' + msg.created_at.slice(11, 16);
+            item.append(author, time, document.createElement('br'));
+        }
+        item.append(document.createTextNode(msg.content.content));
+        box.appendChild(item);
+        item.scrollIntoView();
+        lastSender = String(msg.from_id);
+    });
+})();
@@ -0,0 +1,45 @@
+// показываем подсказки при вводе имени, фамилии или номера телефона, не отправляя форму поиска
+(function () {
+    const input = document.getElementById('filter_field');
+    const box = document.querySelector('.suggestions[data-suggest-url]');
+    if (!input || !box || !window.fetch) {
+        return;
+    }
+    let timer = null;
+    let last = '';
+
+    function show(users) {
+        box.textContent = '';
+        users.forEach(function (user) {
+            const link = document.createElement('a');
+            link.href = '/profile/' + user.id;
+            link.className = 'list-group-item list-group-item-action';
+            link.textContent = user.name + ' ' + user.surname;
+            box.appendChild(link);
+        });
+    }
+
+    input.setAttribute('autocomplete', 'off');
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        // запрашиваем подсказки, только когда пользователь ненадолго перестал печатать
+        timer = setTimeout(function () {
+            const query = input.value.trim();
+            if (query === last) {
+                return;
+            }
+            last = query;
+            if (!query) {
+                show([]);
+                return;
+            }
+            fetch(box.dataset.suggestUrl + '?q=' + encodeURIComponent(query), {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (query === last) {  // ответ на устаревший запрос не показываем
+                        show(data.users);
+                    }
+                });
+        }, 150);
+    });
+})();
@@ -0,0 +1,112 @@
+"""Общие фикстуры тестов: временная база данных, приложение с подключенным API и счетчик SQL-запросов."""
+
+import datetime
+import os
+import shutil
+from contextlib import contextmanager
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from data.db_session import create_session, global_init
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # корень проекта
+
+
+class QueryCounter:
+    """Класс счетчика SQL-запросов, выполненных всеми подключениями к базам данных."""
+
+    def __init__(self):
+        self.statements = []  # тексты выполненных запросов
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        """Количество выполненных запросов."""
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    """Контекстный менеджер, считающий SQL-запросы, выполненные внутри блока."""
+    counter = QueryCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'before_cursor_execute', counter)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Фикстура приложения, работающего с копией базы данных проекта, обновленной всеми миграциями."""
+    db_file = os.path.join(str(tmp_path_factory.mktemp('db')), 'test.sqlite')
+    shutil.copy(os.path.join(ROOT, 'db', 'chats_db.sqlite'), db_file)
+    config = Config(os.path.join(ROOT, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(ROOT, 'migrate'))
+    config.set_main_option('sqlalchemy.url', f'sqlite:///{db_file}')
+    # база проекта помечена ревизией, которой нет в migrate/versions, хотя ее схема соответствует 3138f0441eb9
+    command.stamp(config, '3138f0441eb9', purge=True)
+    command.upgrade(config, 'head')
+    global_init(db_file)
+    from main import app as flask_app
+    from api import api_blueprint
+    from data.ranks import rank_table
+
+    if 'api' not in flask_app.blueprints:
+        flask_app.register_blueprint(api_blueprint, url_prefix='/api')
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    rank_table.refresh(create_session())  # добавляем ранги в базу
+    return flask_app
+
+
+def add_users(session, count: int, start: int = 0) -> list:
+    """Функция, добавляющая пользователей и возвращающая их id.
+    :param session: сессия базы данных
+    :param count: количество пользователей
+    :param start: номер первого пользователя (номера входят в адреса эл. почты и телефоны)"""
+    from data.__all_models import User, Interest
+    from data.ranks import rank_table
+
+    interests = session.query(Interest).order_by(Interest.id).limit(10).all()
+    users = []
+    for i in range(start, start + count):
+        user = User(name=f'Имя{i}', surname=f'Фамилия{i}', email=f'user{i}@example.com',
+                    phone_number=f'+7900{i:07d}', birthday=datetime.datetime(2000, 1, 1), rating=i,
+                    rank_id=rank_table.get_rank_id(i, session), admin=i == 0)
+        user.interests = interests[i % len(interests):][:2] if interests else []
+        users.append(user)
+    session.add_all(users)
+    session.commit()
+    return [user.id for user in users]
+
+
+def add_ads(session, author_ids: list, count: int):
+    """Функция, добавляющая объявления с содержанием и тэгами, по очереди от каждого из авторов.
+    :param session: сессия базы данных
+    :param author_ids: id авторов
+    :param count: количество объявлений"""
+    from data.__all_models import Advertisement, Content, Interest
+
+    interests = session.query(Interest).order_by(Interest.id).limit(10).all()
+    for i in range(count):
+        ad = Advertisement(title=f'Объявление {i}', author_id=author_ids[i % len(author_ids)], price=i + 1,
+                           content=Content(content=f'Содержание {i}'))
+        ad.interests = interests[i % len(interests):][:2]
+        session.add(ad)
+    session.commit()
+
+
+def add_messages(session, items: list):
+    """Функция, отправляющая пачку сообщений (вместе с диалогами и рейтингом отправителей).
+    :param session: сессия базы данных
+    :param items: список кортежей (id отправителя, id получателя, текст сообщения)"""
+    from data.messaging import store_messages
+
+    store_messages(session, items)
@@ -0,0 +1,98 @@
+"""Проверка того, что количество SQL-запросов на страницу и на запрос API ограничено и не зависит
+от количества строк в базе: каждый обработчик выполняется на маленькой базе и на заполненной."""
+
+import pytest
+
+from data.db_session import create_session
+from tests.conftest import add_ads, add_messages, add_users, count_queries
+
+# максимальное количество SQL-запросов на обработчик: (при сброшенных кэшах процесса, при заполненных кэшах);
+# при сброшенных кэшах добавляются загрузка клиента, таблицы рангов, доски почета и ленты объявлений
+MAX_STATEMENTS = {
+    '/chats/{companion}': (7, 6),
+    '/chats': (3, 1),
+    '/top': (4, 1),
+    '/': (4, 2),
+    '/profile/{companion}': (7, 5),
+    '/api/ads': (4, 2),
+    '/api/users': (4, 2),
+    '/api/messages/{companion}': (5, 4),
+}
+
+
+def reset_caches():
+    """Функция, сбрасывающая кэши процесса, чтобы обработчик выполнил все свои запросы к базе."""
+    from data.ads_feed import ads_feed
+    from data.identity_cache import user_cache
+    from data.leaderboard import top_cache
+
+    user_cache.clear()
+    ads_feed.invalidate()
+    top_cache._version = None
+
+
+def measure(app, client_id: int, companion_id: int, token: str) -> dict:
+    """Функция, возвращающая количество SQL-запросов каждого обработчика из MAX_STATEMENTS в виде словаря
+    {обработчик: (количество при сброшенных кэшах, количество при повторном запросе)}.
+    :param app: приложение
+    :param client_id: id клиента, от имени которого выполняются запросы
+    :param companion_id: id собеседника клиента
+    :param token: токен API клиента"""
+    counts = {}
+    for endpoint in MAX_STATEMENTS:
+        url = endpoint.format(companion=companion_id)
+        client = app.test_client()
+        with client.session_transaction() as session:  # входим в аккаунт клиента без проверки пароля
+            session['_user_id'] = str(client_id)
+            session['_fresh'] = True
+        if url.startswith('/api/'):
+            url += '?x-access-token=' + token
+        reset_caches()
+        with count_queries() as cold:
+            response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        with count_queries() as warm:
+            response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        counts[endpoint] = (cold.count, warm.count)
+    return counts
+
+
+@pytest.fixture(scope='module')
+def statement_counts(app):
+    """Фикстура, измеряющая количество запросов обработчиков на маленькой базе и на заполненной.
+    Возвращает словарь {обработчик: {'small': результат measure, 'large': результат measure}}."""
+    from data.__all_models import User
+    from data.tokens import issue_tokens
+
+    session = create_session()
+    client_id, companion_id, other_id = add_users(session, 3)
+    add_ads(session, [client_id, companion_id], 2)
+    add_messages(session, [(client_id, companion_id, 'привет'), (companion_id, client_id, 'привет!'),
+                           (other_id, client_id, 'здравствуйте')])
+    token = issue_tokens(session.query(User).get(client_id))['token']
+    small = measure(app, client_id, companion_id, token)
+
+    # заполняем базу: сотни пользователей, диалогов и объявлений и тысяча сообщений в открытом чате
+    user_ids = add_users(session, 300, start=3)
+    add_ads(session, user_ids + [client_id], 200)
+    add_messages(session, [(user_id, client_id, f'сообщение от {user_id}') for user_id in user_ids])
+    add_messages(session, [(client_id, companion_id, f'сообщение {i}') if i % 2 else
+                           (companion_id, client_id, f'ответ {i}') for i in range(1000)])
+    large = measure(app, client_id, companion_id, token)
+    session.close()
+    return {endpoint: {'small': small[endpoint], 'large': large[endpoint]} for endpoint in MAX_STATEMENTS}
+
+
+@pytest.mark.parametrize('endpoint', list(MAX_STATEMENTS))
+def test_statement_count_is_bounded(statement_counts, endpoint):
+    counts = statement_counts[endpoint]
+    for size in ('small', 'large'):
+        for measured, limit in zip(counts[size], MAX_STATEMENTS[endpoint]):
+            assert measured <= limit, (size, counts)
+
+
+@pytest.mark.parametrize('endpoint', list(MAX_STATEMENTS))
+def test_statement_count_does_not_grow_with_rows(statement_counts, endpoint):
+    counts = statement_counts[endpoint]
+    assert counts['large'] == counts['small'], counts